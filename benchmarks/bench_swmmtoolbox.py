@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of reading SWMM output files of increasing size.
+
+Synthetic output files are written for each size tier with
+'swmmtoolbox.synthetic', then opening the header, 'extract',
+'fast_extract', 'extract_arr', and the command line are timed against
+them.  The command line is timed for 'catalog', 'listdetail', and
+'listvariables', which only read the header, and for 'extract'.  For
+each operation the best time of the repeats is reported with the
+throughput, as the size of the output file over that time, and the peak
+memory allocated, measured with tracemalloc in a separate run.  The
+command line is run in a new interpreter, so its peak is the maximum
+resident size of the child process instead.
+
+Run from the root of the repository::
+
+    python benchmarks/bench_swmmtoolbox.py --tiers small,medium
+
+The files are read from the operating system cache after the first
+repeat, so the numbers show the cost of parsing and gathering rather
+than of the disk.
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swmmtoolbox import swmmtoolbox  # noqa: E402
+from swmmtoolbox import synthetic  # noqa: E402
+
+# Element and period counts of each tier.
+TIERS = {'small': dict(nsubcatch=50, nnodes=100, nlinks=100, npolluts=1,
+                       nperiods=1000),
+         'medium': dict(nsubcatch=500, nnodes=1000, nlinks=1000, npolluts=2,
+                        nperiods=10000),
+         'large': dict(nsubcatch=2000, nnodes=5000, nlinks=5000, npolluts=2,
+                       nperiods=10000)}
+
+CLI = ('import sys; '
+       'from swmmtoolbox.swmmtoolbox import main; '
+       'sys.argv[0] = "swmmtoolbox"; '
+       'main()')
+
+
+def operations(filename):
+    """Return the (name, function, reads periods) triples for one file.
+
+    Throughput is only reported for the operations that read the period
+    records, opening the header reads a small part of the file.
+    """
+    one = 'node,J1,0'
+    every = 'node,*,0'
+    ops = [('open',
+            lambda: swmmtoolbox.SwmmExtract(filename).close(),
+            False),
+           ('open lazy',
+            lambda: swmmtoolbox.SwmmExtract(filename, lazy=True).close(),
+            False),
+           ('fast_extract one',
+            lambda: swmmtoolbox.fast_extract(filename, one),
+            True),
+           ('fast_extract nodes',
+            lambda: swmmtoolbox.fast_extract(filename, every),
+            True),
+           ('extract_arr one',
+            lambda: swmmtoolbox.extract_arr(filename, one),
+            True),
+           ('extract_arr nodes',
+            lambda: swmmtoolbox.extract_arr(filename, every),
+            True),
+           ('extract_arr nodes workers=4',
+            lambda: swmmtoolbox.extract_arr(filename, every, workers=4),
+            True)]
+    try:
+        from tstoolbox import tsutils  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        ops.insert(2, ('extract one', lambda: quiet(swmmtoolbox.extract,
+                                                    filename,
+                                                    one), True))
+    return ops
+
+
+def commands(filename):
+    """Return the (name, arguments, reads periods) of the CLI timed."""
+    return [('cli catalog', ['catalog', filename], False),
+            ('cli listdetail', ['listdetail', filename, 'node'], False),
+            ('cli listvariables', ['listvariables', filename], False),
+            ('cli extract one', ['extract', filename, 'node,J1,0'], True)]
+
+
+def quiet(function, *args):
+    """Run function without the table it prints."""
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            return function(*args)
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(function):
+    """Peak bytes allocated while running function once."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_cli(args, repeat):
+    """Best time and peak resident bytes of a command, or None."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    times = []
+    peak = None
+    with open(os.devnull, 'wb') as devnull:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            code = subprocess.call([sys.executable, '-c', CLI] + args,
+                                   stdout=devnull,
+                                   stderr=devnull)
+            times.append(time.perf_counter() - start)
+            if code != 0:
+                return None
+    if resource is not None:
+        # Kilobytes on Linux, the largest of all the children so far, so
+        # tiers are run from small to large.
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--tiers',
+                        default='small,medium',
+                        help='Comma separated tiers from {0}.'.format(
+                            ', '.join(sorted(TIERS))))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times each operation is timed.')
+    parser.add_argument('--no-cli', action='store_true',
+                        help='Skip the command line benchmarks.')
+    parser.add_argument('--directory',
+                        help='Keep the synthetic files in this directory '
+                             'instead of a temporary one.')
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp()
+    row = '{0:<8} {1:<28} {2:>10} {3:>10} {4:>10}'
+    print(row.format('tier', 'operation', 'seconds', 'MB/s', 'peak MB'))
+    try:
+        for tier in args.tiers.split(','):
+            filename = os.path.join(directory, '{0}.out'.format(tier))
+            if not os.path.exists(filename):
+                synthetic.write_output(filename, **TIERS[tier])
+            megabytes = os.path.getsize(filename) / 1e6
+            print('{0:<8} {1:.1f} MB'.format(tier, megabytes))
+            for name, function, periods in operations(filename):
+                seconds = best_time(function, args.repeat)
+                peak = peak_memory(function)
+                print(row.format(tier,
+                                 name,
+                                 '{0:.4f}'.format(seconds),
+                                 '{0:.1f}'.format(megabytes / seconds)
+                                 if periods else '',
+                                 '{0:.1f}'.format(peak / 1e6)))
+            if args.no_cli:
+                continue
+            for name, arguments, periods in commands(filename):
+                result = run_cli(arguments, args.repeat)
+                if result is None:
+                    print(row.format(tier, name, 'failed', '', ''))
+                    continue
+                seconds, peak = result
+                print(row.format(tier,
+                                 name,
+                                 '{0:.4f}'.format(seconds),
+                                 '{0:.1f}'.format(megabytes / seconds)
+                                 if periods else '',
+                                 '' if peak is None
+                                 else '{0:.1f}'.format(peak / 1e6)))
+    finally:
+        if args.directory is None:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
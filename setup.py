@@ -15,11 +15,20 @@ install_requires = [
     # List your project dependencies here.
     # For more details, see:
     # http://packages.python.org/distribute/setuptools.html#declaring-dependencies
+    'numpy',
+    'pandas',
     'tstoolbox >= 1.12.12.9',
     'sphinx >= 1.3',
-    'future',
 ]
 
+extras_require = {
+    # Optional output formats of the 'export' command.
+    'parquet': ['pyarrow'],
+    'hdf5': ['h5py'],
+    # The 'open_dataset' function.
+    'xarray': ['xarray'],
+}
+
 setup(name='swmmtoolbox',
       version=version,
       description="The swmmtoolbox extracts data from the Storm Water Management Model 5 binary output file.",
@@ -33,8 +42,8 @@ setup(name='swmmtoolbox',
           'License :: OSI Approved :: BSD License',
           'Natural Language :: English',
           'Operating System :: OS Independent',
-          'Programming Language :: Python :: 2',
           'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3 :: Only',
           'Topic :: Scientific/Engineering',
           'Topic :: Software Development :: Libraries :: Python Modules',
       ],
@@ -46,7 +55,9 @@ setup(name='swmmtoolbox',
       package_dir={'': '.'},
       include_package_data=True,
       zip_safe=False,
+      python_requires='>=3.7',
       install_requires=install_requires,
+      extras_require=extras_require,
       entry_points={
           'console_scripts':
               ['swmmtoolbox=swmmtoolbox.swmmtoolbox:main']
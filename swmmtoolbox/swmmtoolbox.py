@@ -3,25 +3,25 @@
 """
 Reads and formats data from the SWMM 5 output file.
 """
-from __future__ import absolute_import
-from __future__ import print_function
-
-from builtins import zip
-from builtins import str
-from builtins import range
-from builtins import object
+import argparse
+import contextlib
+import functools
 import sys
 import struct
+import tempfile
 import datetime
+import hashlib
+import json
 import os
 import math
 import mmap
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import zipfile
 
-import mando
-from mando.rst_text_formatter import RSTHelpFormatter
-import pandas as pd
-
-from tstoolbox import tsutils
+import numpy as np
 
 PROPCODE = {0: {1: 'Area'},
             1: {0: 'Type',
@@ -124,7 +124,145 @@ _SWMM_FLOWUNITS = {
 }
 
 
-_LOCAL_DOCSTRINGS = tsutils.docstrings
+# Bump when the layout of the header cache changes.
+_CACHE_VERSION = 2
+
+# The series-major companion file written by 'transpose' starts with this
+# header; the float32 series follow at _TRANSPOSED_HEADERSIZE.
+_TRANSPOSED_MAGIC = 516114523
+_TRANSPOSED_VERSION = 1
+_TRANSPOSED_HEADER = '=2i5q'
+_TRANSPOSED_HEADERSIZE = 64
+
+# Upper limit of the results read into memory at once by streaming passes.
+_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+# Only numpy is imported with the module.  pandas, tstoolbox, and mando are
+# imported by the functions and commands that need them, so that reading
+# the binary file, and starting the command line, stay fast.
+
+# Commands recorded by '_command' and registered with mando by 'main'.
+_COMMANDS = []
+
+
+def _command(*args, **kwargs):
+    """Record a function to register as a command in 'main'.
+
+    Takes the same arguments as 'mando.command'.
+    """
+    def decorator(fn):
+        _COMMANDS.append((fn, args, kwargs))
+        return fn
+    return decorator
+
+
+class _RSTHelpFormatter(argparse.RawTextHelpFormatter):
+    """Hand over to mando's 'RSTHelpFormatter' only when help is shown.
+
+    argparse also creates formatters while adding arguments, and
+    'RSTHelpFormatter' imports docutils.
+    """
+    def _rst(self):
+        from mando.rst_text_formatter import RSTHelpFormatter
+        formatter = RSTHelpFormatter.__new__(RSTHelpFormatter)
+        formatter.__dict__.update(self.__dict__)
+        return formatter
+
+    def format_help(self):
+        return self._rst().format_help()
+
+    def format_usage(self):
+        return self._rst().format_usage()
+
+
+def _doc(fdict):
+    """Return a decorator that formats a docstring, like 'tsutils.doc'."""
+    def decorator(fn):
+        fn.__doc__ = fn.__doc__.format(**fdict)
+        return fn
+    return decorator
+
+
+# The descriptions shared with tstoolbox, copied from 'tsutils.docstrings'.
+_LOCAL_DOCSTRINGS = {}
+_LOCAL_DOCSTRINGS['start_date'] = '''start_date : str
+        [optional, defaults to first date in time-series, input filter]
+
+        The start_date of the series in ISOdatetime format, or 'None'
+        for beginning.
+        '''
+_LOCAL_DOCSTRINGS['end_date'] = '''end_date : str
+        [optional, defaults to last date in time-series, input filter]
+
+        The end_date of the series in ISOdatetime format, or 'None' for
+        end.
+        '''
+_LOCAL_DOCSTRINGS['tablefmt'] = '''tablefmt : str
+        [optional, default is 'csv', output format]
+
+        The table format.  Can be one of 'csv', 'tsv', 'plain',
+        'simple', 'grid', 'pipe', 'orgtbl', 'rst', 'mediawiki', 'latex',
+        'latex_raw' and 'latex_booktabs'.
+        '''
+_LOCAL_DOCSTRINGS['header'] = '''header : str
+        [optional, default is 'default', output format]
+
+        This is if you want a different header than is the default for
+        this output table.  Pass a list of strings for each column in
+        the table.
+        '''
+_LOCAL_DOCSTRINGS['input_ts'] = '''input_ts : str
+        [optional though required if using within Python, default is '-'
+        (stdin)]
+
+        Whether from a file or standard input, data requires a header of
+        column names.  The default header is the first line of the
+        input, but this can be changed using the 'skiprows' option.
+
+        Most separators will be automatically detected. Most common date
+        formats can be used, but the closer to ISO 8601 date/time
+        standard the better.
+
+        Command line:
+
+            +-------------------------+------------------------+
+            | Keyword Example         | Description            |
+            +=========================+========================+
+            | --input_ts=filename.csv | to read 'filename.csv' |
+            +-------------------------+------------------------+
+            | --input_ts='-'          | to read from standard  |
+            |                         | input (stdin)          |
+            +-------------------------+------------------------+
+
+            In many cases it is better to use redirection rather that
+            use `--input_ts=filename.csv`.  The following are identical:
+
+            From a file:
+
+                command subcmd --input_ts=filename.csv
+
+            From standard input:
+
+                command subcmd --input_ts=- < filename.csv
+
+            The BEST way since you don't have to include `--input_ts=-`
+            because that is the default:
+
+                command subcmd < file.csv
+
+            Can also combine commands by piping:
+
+                command subcmd < filein.csv | command subcmd1 > fileout.csv
+
+        As Python Library::
+
+            You MUST use the `input_ts=...` option where `input_ts` can
+            be one of a [pandas DataFrame, pandas Series, dict, tuple,
+            list, StringIO, or file name].
+
+            If result is a time series, returns a pandas DataFrame.
+        '''
 _LOCAL_DOCSTRINGS['filename'] = '''filename : str
         Filename of SWMM output file.  The SWMM model must complete
         successfully for "swmmtoolbox" to correctly read it.
@@ -148,28 +286,352 @@ _LOCAL_DOCSTRINGS['labels'] = '''labels : str
         VARINDEX can be retrieved with::
 
             'swmmtoolbox listvariables filename.out'
+
+        NAME and VARINDEX can be '*' to select every element or every
+        variable of the type, for example 'link,*,0' for the flow in
+        every link.
+        '''
+_LOCAL_DOCSTRINGS['itemtypes'] = '''itemtype : str
+        Comma separated list of types, for example 'node,link', to
+        include every element and variable of, in addition to any
+        labels.  With neither labels nor 'itemtype' every series in the
+        file is used.
+        '''
+_LOCAL_DOCSTRINGS['chunk_periods'] = '''chunk_periods : int
+        Number of periods read at a time.  Defaults to a block of about
+        64 MB.
+        '''
+_LOCAL_DOCSTRINGS['start_period'] = '''start_period : int
+        The index of the first reporting period to extract, counting
+        from zero.  Combined with 'start_date' the later of the two
+        is used.
+        '''
+_LOCAL_DOCSTRINGS['end_period'] = '''end_period : int
+        The index of the last reporting period to extract, inclusive.
+        Combined with 'end_date' the earlier of the two is used.
+        '''
+_LOCAL_DOCSTRINGS['resample'] = '''resample : str
+        Fixed frequency, for example '1h' or '1D', to aggregate to while
+        reading.  Bins are aligned to the start of the day of the first
+        report, closed and labeled on the left, like pandas 'resample'.
+        '''
+_LOCAL_DOCSTRINGS['workers'] = '''workers : int
+        Number of threads that read shards of the period range in
+        parallel.  Defaults to reading in the calling thread.
         '''
+_LOCAL_DOCSTRINGS['how'] = '''how : str
+        Comma separated list of the aggregations used with 'resample',
+        from 'mean', 'min', 'max', 'sum', and 'count'.  With more than one
+        the aggregation is appended to each column name.
+        '''
+
+_LOCAL_DOCSTRINGS['profile'] = '''profile
+        [optional, Python API only]
+
+        A 'Profile' to fill in with the time spent in each phase and the
+        reads, seeks, and memory maps of the extraction, or a callable
+        that is given a new 'Profile' once the extraction finishes.  See
+        also 'add_profile_hook'.
+        '''
+_LOCAL_DOCSTRINGS['profile_cli'] = '''profile : bool
+        Write the time spent in each phase, the reads, seeks, and memory
+        maps, and the peak memory allocated to standard error.
+        '''
+
+_LOCAL_DOCSTRINGS['files_and_labels'] = '''files_and_labels : str
+        The SWMM output files followed by the labels.  Every argument in
+        the label format 'TYPE,NAME,VARINDEX' is taken as a label, unless
+        it is an existing file, and the rest as output files, for example
+        'run1.out run2.out node,C64,1 link,*,0'.
+        '''
+
+# Aggregations available to 'SwmmExtract.get_resampled'.
+_RESAMPLE_HOW = ('mean', 'min', 'max', 'sum', 'count')
+
+
+def _to_datetime(dates):
+    """Convert SWMM dates to a DatetimeIndex.
+
+    SWMM stores dates as float days since 1899-12-30, so the fraction of
+    a day is rounded to the nearest second to remove the float error.
+    """
+    import pandas as pd
+
+    seconds = np.round(np.asarray(dates, dtype='f8') * 86400).astype('int64')
+    return pd.DatetimeIndex((np.datetime64('1899-12-30', 's') +
+                             seconds.astype('timedelta64[s]'))
+                            .astype('datetime64[ns]'))
+
+
+def _to_pydatetime(date):
+    """Parse a date in any format pandas accepts to a datetime."""
+    import pandas as pd
+
+    return pd.Timestamp(date).to_pydatetime()
+
+
+def _transposed_filename(filename):
+    """Name of the series-major companion of an output file."""
+    return '{0}.swmmtoolbox.series'.format(filename)
+
+
+# Counters of a Profile, in the order they are reported.
+_PROFILE_COUNTERS = ('bytes_read', 'reads', 'seeks', 'mmaps', 'bytes_mapped')
+
+
+class Profile(object):
+    """Time spent in each phase and the I/O of an extraction.
+
+    Pass an instance as 'profile' to 'SwmmExtract' or to 'extract',
+    'fast_extract', 'extract_arr', or 'ensemble' to fill it in.  Nothing
+    is recorded unless asked for.
+
+    Parameters
+    ----------
+    memory : bool
+        Trace the peak memory allocated with tracemalloc, which slows
+        down allocation while it runs.
+
+    Attributes
+    ----------
+    name : str
+        The function profiled, None for a 'SwmmExtract' used directly.
+    filename : str
+        The output file read.
+    timings : dict
+        Seconds spent in each phase, in the order the phases first ran,
+        from 'header', 'labels', 'dates', 'read', 'resample', 'frame',
+        and 'output', then 'total' for the whole extraction.  Time spent
+        in a phase is not counted in the phase around it, so the phases
+        add up to at most 'total'.
+    counters : dict
+        'bytes_read' and 'reads' of explicit reads, 'seeks' of the file
+        position, 'mmaps' created, and 'bytes_mapped', the size of the
+        period records gathered from memory maps.
+    peak_memory : int
+        Peak bytes allocated during the extraction, or None unless
+        'memory' is True and tracemalloc was not already tracing.
+
+    Phases are timed for one thread at a time, while the counters also
+    take the reads of worker threads.
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.name = None
+        self.filename = None
+        self.timings = {}
+        self.counters = dict.fromkeys(_PROFILE_COUNTERS, 0)
+        self.peak_memory = None
+        self._stack = []
+        self._since = None
+        # Worker threads of 'get_values' count their reads.
+        self._lock = threading.Lock()
+
+    def _charge(self, now):
+        """Add the time since the last switch to the running phase."""
+        if self._stack:
+            self.timings[self._stack[-1]] += now - self._since
+        self._since = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the block as phase 'name', pausing the enclosing phase."""
+        self._charge(time.perf_counter())
+        self.timings.setdefault(name, 0.0)
+        self._stack.append(name)
+        try:
+            yield self
+        finally:
+            self._charge(time.perf_counter())
+            self._stack.pop()
+
+    def count(self, **counts):
+        """Add to the counters, for example 'count(reads=1, seeks=1)'."""
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Time the whole block as 'total' and trace its peak memory."""
+        import tracemalloc
+
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings['total'] = (self.timings.get('total', 0.0) +
+                                     time.perf_counter() - start)
+            if tracing:
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    def as_dict(self):
+        """Return the profile as a dictionary of plain values."""
+        return {'name': self.name,
+                'filename': self.filename,
+                'timings': dict(self.timings),
+                'counters': dict(self.counters),
+                'peak_memory': self.peak_memory}
+
+    def __str__(self):
+        lines = ['{0} "{1}"'.format(self.name, self.filename)]
+        for name, seconds in self.timings.items():
+            lines.append('    {0:<14}{1:>14.6f} s'.format(name, seconds))
+        for name in _PROFILE_COUNTERS:
+            lines.append('    {0:<14}{1:>14d}'.format(name,
+                                                     self.counters[name]))
+        if self.peak_memory is not None:
+            lines.append('    {0:<14}{1:>14d} bytes'.format(
+                'peak_memory', self.peak_memory))
+        return '\n'.join(lines)
+
+
+class _NoProfile(object):
+    """Stands in for a Profile when profiling is off."""
+    def phase(self, name):
+        return self
+
+    def count(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NO_PROFILE = _NoProfile()
+
+# Callbacks given the Profile of every extraction, see 'add_profile_hook'.
+_PROFILE_HOOKS = []
+
+
+def add_profile_hook(callback):
+    """Profile every extraction and give each Profile to 'callback'.
+
+    Applies to 'extract', 'fast_extract', 'extract_arr', and 'ensemble'
+    in this process, for example to log them from a service::
+
+        swmmtoolbox.add_profile_hook(lambda p: log.info(p.as_dict()))
+
+    """
+    _PROFILE_HOOKS.append(callback)
+
+
+def remove_profile_hook(callback):
+    """Stop giving Profiles to a callback added with 'add_profile_hook'."""
+    _PROFILE_HOOKS.remove(callback)
+
+
+@contextlib.contextmanager
+def _profiling(profile, name, filename):
+    """Yield the Profile of one extraction and then give it to callbacks.
+
+    'profile' is None, a Profile to fill in, or a callable given a new
+    Profile.  Yields '_NO_PROFILE' when neither it nor a hook asks for
+    profiling.
+    """
+    callbacks = list(_PROFILE_HOOKS)
+    if isinstance(profile, Profile):
+        record = profile
+    elif profile is not None:
+        record = Profile()
+        callbacks.insert(0, profile)
+    elif callbacks:
+        record = Profile()
+    else:
+        yield _NO_PROFILE
+        return
+    record.name = name
+    record.filename = filename
+    with record.measure():
+        yield record
+    for callback in callbacks:
+        callback(record)
+
+
+def _phase(name):
+    """Decorate a method to time it as phase 'name' of 'self.profile'."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.profile.phase(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class SwmmExtract(object):
-    """The class that handles all extraction of data from the out file."""
-    def __init__(self, filename):
+    """The class that handles all extraction of data from the out file.
+
+    Parameters
+    ----------
+    filename : str
+        Filename of SWMM output file.
+    cache
+        Optional cache of the parsed header.  True keeps a
+        '.swmmtoolbox.npz' file next to the output file, a string names a
+        directory to keep cache files in, and False disables the cache.
+        None, the default, uses the SWMMTOOLBOX_CACHE environment variable
+        the same way, with '1' meaning next to the output file.  A cache
+        file is only used while the size, modification time, and magic
+        numbers of the output file match.
+    follow : bool
+        Open a file that SWMM is still writing.  The header is read from
+        the start of the file and 'swmm_nperiods' is the number of
+        complete periods written so far, updated by 'refresh', 'poll',
+        and 'follow_periods'.  The header cache is not used.
+    lazy : bool
+        Only read the counts, variable codes, and dates needed to locate
+        the results when the file is opened.  The names, pollutant codes,
+        and property tables are parsed on first use.  A current header
+        cache is still used, but is not written.  Ignored when following.
+    profile : Profile
+        Record the time spent in each phase and the reads, seeks, and
+        memory maps of this instance in a 'Profile'.
+
+    Close the file with 'close', or use the instance as a context
+    manager, to release the file handle and memory maps promptly.
+
+    Nothing is changed by reading once the file is opened: values are
+    read with positional reads or from a shared read-only memory map and
+    never through the position of 'fp'.  One instance can therefore serve
+    any number of threads at once without locking.  Only 'refresh',
+    'poll', and 'follow_periods' of a followed file change its state.
+    """
+    def __init__(self, filename, cache=None, follow=False, lazy=False,
+                 profile=None):
 
         self.RECORDSIZE = 4
 
-        self.fp = open(filename, 'rb')
+        self.profile = _NO_PROFILE if profile is None else profile
 
-        self.fp.seek(-6 * self.RECORDSIZE, 2)
+        self.filename = filename
+        self.fp = open(filename, 'rb')
 
-        self.Namesstartpos, \
-            self.offset0, \
-            self.startpos, \
-            self.swmm_nperiods, \
-            errcode, \
-            magic2 = struct.unpack('6i', self.fp.read(6 * self.RECORDSIZE))
+        try:
+            self._open(cache, follow, lazy)
+        except struct.error:
+            # Too short for the magic number, trailer, or header.
+            self.fp.close()
+            raise ValueError('''
+*
+*   The header of "{0}" is incomplete.  SWMM may not have written it yet.
+*
+'''.format(filename))
+        except BaseException:
+            self.fp.close()
+            raise
 
-        self.fp.seek(0, 0)
-        magic1 = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
+    def _open(self, cache, follow, lazy):
+        """Read the trailer and header, see the class for the arguments."""
+        self.follow = follow
+        magic1 = struct.unpack('i', self._read_at(0, 0, self.RECORDSIZE))[0]
 
         if magic1 != 516114522:
             raise ValueError('''
@@ -177,144 +639,78 @@ class SwmmExtract(object):
 *   First magic number incorrect.
 *
 ''')
-        if magic2 != 516114522:
-            raise ValueError('''
+
+        if follow:
+            # SWMM writes the trailer last, so the positions are found
+            # while reading the header and the number of periods from the
+            # size of the file.
+            self.Namesstartpos = 7 * self.RECORDSIZE
+            self.offset0 = None
+            self.startpos = None
+            self.swmm_nperiods = 0
+            self.complete = False
+            magic2 = None
+        else:
+            self.Namesstartpos, \
+                self.offset0, \
+                self.startpos, \
+                self.swmm_nperiods, \
+                errcode, \
+                magic2 = struct.unpack('6i',
+                                       self._read_at(-6 * self.RECORDSIZE,
+                                                     2,
+                                                     6 * self.RECORDSIZE))
+            self.complete = True
+
+            if magic2 != 516114522:
+                raise ValueError('''
 *
 *   Second magic number incorrect.
 *
 ''')
-        if errcode != 0:
-            raise ValueError('''
+            if errcode != 0:
+                raise ValueError('''
 *
 *   Error code in output file indicates a problem with the run.
 *
 ''')
-        if self.swmm_nperiods == 0:
-            raise ValueError('''
+            if self.swmm_nperiods == 0:
+                raise ValueError('''
 *
 *   There are zero time periods in the output file.
 *
 ''')
 
-        # --- otherwise read additional parameters from start of file
-        (version,
-         self.swmm_flowunits,
-         self.swmm_nsubcatch,
-         self.swmm_nnodes,
-         self.swmm_nlinks,
-         self.swmm_npolluts) = struct.unpack('6i',
-                                             self.fp.read(6 * self.RECORDSIZE))
-        if version < 5100:
-            self.varcode = VARCODE_OLD
-        else:
-            self.varcode = VARCODE
-
         self.itemlist = ['subcatchment', 'node', 'link', 'pollutant', 'system']
 
-        # Read in the names
-        self.fp.seek(self.Namesstartpos, 0)
-        self.names = {0: [], 1: [], 2: [], 3: [], 4: []}
-        number_list = [self.swmm_nsubcatch,
-                       self.swmm_nnodes,
-                       self.swmm_nlinks,
-                       self.swmm_npolluts]
-        for i, j in enumerate(number_list):
-            for _ in range(j):
-                stringsize = struct.unpack('i',
-                                           self.fp.read(self.RECORDSIZE))[0]
-                self.names[i].append(
-                    struct.unpack('{0}s'.format(stringsize),
-                                  self.fp.read(stringsize))[0])
-
-        # Stupid Python 3
-        for key in self.names:
-            collect_names = []
-            for name in self.names[key]:
-                # Why would SMMM allow spaces in names?  Anyway...
-                try:
-                    rname = str(name, 'ascii', 'replace')
-                except TypeError:
-                    rname = name.decode('ascii', 'replace')
-                try:
-                    collect_names.append(rname.decode())
-                except AttributeError:
-                    collect_names.append(rname)
-            self.names[key] = collect_names
+        self.magic = (magic1, magic2)
 
-        # Read pollutant concentration codes
-        # = Number of pollutants * 4 byte integers
-        self.pollutant_codes = struct.unpack(
-            '{0}i'.format(self.swmm_npolluts),
-            self.fp.read(self.swmm_npolluts * self.RECORDSIZE))
-
-        self.propcode = {}
-        self.prop = {0: [], 1: [], 2: []}
-        nsubprop = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.propcode[0] = struct.unpack(
-            '{0}i'.format(nsubprop),
-            self.fp.read(nsubprop * self.RECORDSIZE))
-        for i in range(self.swmm_nsubcatch):
-            rprops = struct.unpack(
-                '{0}f'.format(nsubprop),
-                self.fp.read(nsubprop * self.RECORDSIZE))
-            self.prop[0].append(list(zip(self.propcode[0], rprops)))
-
-        nnodeprop = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.propcode[1] = struct.unpack(
-            '{0}i'.format(nnodeprop),
-            self.fp.read(nnodeprop * self.RECORDSIZE))
-        for i in range(self.swmm_nnodes):
-            rprops = struct.unpack(
-                'i{0}f'.format(nnodeprop - 1),
-                self.fp.read(nnodeprop * self.RECORDSIZE))
-            self.prop[1].append(list(zip(self.propcode[1], rprops)))
-
-        nlinkprop = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.propcode[2] = struct.unpack(
-            '{0}i'.format(nlinkprop),
-            self.fp.read(nlinkprop * self.RECORDSIZE))
-        for i in range(self.swmm_nlinks):
-            rprops = struct.unpack(
-                'i{0}f'.format(nlinkprop - 1),
-                self.fp.read(nlinkprop * self.RECORDSIZE))
-            self.prop[2].append(list(zip(self.propcode[2], rprops)))
-
-        self.vars = {}
-        self.swmm_nsubcatchvars = struct.unpack(
-            'i', self.fp.read(self.RECORDSIZE))[0]
-        self.vars[0] = struct.unpack(
-            '{0}i'.format(self.swmm_nsubcatchvars),
-            self.fp.read(self.swmm_nsubcatchvars * self.RECORDSIZE))
-
-        self.nnodevars = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.vars[1] = struct.unpack(
-            '{0}i'.format(self.nnodevars),
-            self.fp.read(self.nnodevars * self.RECORDSIZE))
-
-        self.nlinkvars = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.vars[2] = struct.unpack(
-            '{0}i'.format(self.nlinkvars),
-            self.fp.read(self.nlinkvars * self.RECORDSIZE))
+        # Sections of the header parsed on first use.
+        self.lazy = lazy and not follow
+        self._names = None
+        self._pollutant_codes = None
+        self._properties = None
+        self._prop = None
+        self._name_index = None
+        self._varcode = None
 
-        self.vars[3] = [0]
-
-        self.nsystemvars = struct.unpack('i', self.fp.read(self.RECORDSIZE))[0]
-        self.vars[4] = struct.unpack(
-            '{0}i'.format(self.nsystemvars),
-            self.fp.read(self.nsystemvars * self.RECORDSIZE))
-
-        # System vars do not have names per se, but made names = number labels
-        self.names[4] = [self.varcode[4][i] for i in self.vars[4]]
+        if follow:
+            cachefile = None
+        else:
+            cachefile = self._cache_filename(cache)
+        if cachefile is None or not self._load_cache(cachefile):
+            if self.lazy:
+                self._read_layout()
+            else:
+                self._read_header()
+            if cachefile is not None and not self.lazy:
+                self._save_cache(cachefile)
 
-        self.startdate = struct.unpack(
-            'd', self.fp.read(2 * self.RECORDSIZE))[0]
         days = int(self.startdate)
-        seconds = (self.startdate - days) * 86400
+        seconds = round((self.startdate - days) * 86400)
         self.startdate = datetime.datetime(1899, 12, 30) + \
             datetime.timedelta(days=days, seconds=seconds)
 
-        self.reportinterval = struct.unpack(
-            'i', self.fp.read(self.RECORDSIZE))[0]
         self.reportinterval = datetime.timedelta(
             seconds=self.reportinterval)
 
@@ -327,12 +723,1128 @@ class SwmmExtract(object):
             self.swmm_nlinks * self.nlinkvars +
             self.nsystemvars)
 
+        # One record per reporting period, laid out exactly as SWMM writes
+        # it: the date as a double followed by the single precision values
+        # for every subcatchment, node, link, and the system.
+        self.record_dtype = np.dtype([
+            ('date', 'f8'),
+            ('subcatchment', 'f4', (self.swmm_nsubcatch,
+                                    self.swmm_nsubcatchvars)),
+            ('node', 'f4', (self.swmm_nnodes, self.nnodevars)),
+            ('link', 'f4', (self.swmm_nlinks, self.nlinkvars)),
+            ('system', 'f4', (self.nsystemvars,))])
+
+        # Number of variables per item and the column where each type
+        # starts in a period record counted in RECORDSIZE units.  The
+        # first two columns hold the date.
+        self.varsperitem = {0: self.swmm_nsubcatchvars,
+                            1: self.nnodevars,
+                            2: self.nlinkvars,
+                            4: self.nsystemvars}
+        self.typestart = {0: 2}
+        self.typestart[1] = (self.typestart[0] +
+                             self.swmm_nsubcatch * self.swmm_nsubcatchvars)
+        self.typestart[2] = (self.typestart[1] +
+                             self.swmm_nnodes * self.nnodevars)
+        self.typestart[4] = (self.typestart[2] +
+                             self.swmm_nlinks * self.nlinkvars)
+
+        self._mmap = None
+        self._results = None
+        self._series = None
+        self._polled = 0
+        # Only taken to create the shared memory map.
+        self._lock = threading.Lock()
+        if follow:
+            self.refresh()
+
+    def close(self):
+        """Release the file handle and the memory maps.
+
+        Arrays still referring to the memory maps keep them open until
+        they are freed.
+        """
+        self._results = None
+        for name in ['_mmap', '_series']:
+            mapped = getattr(self, name)
+            setattr(self, name, None)
+            if isinstance(mapped, np.memmap):
+                mapped = mapped._mmap
+            try:
+                if mapped is not None and mapped is not False:
+                    mapped.close()
+            except BufferError:
+                pass
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _cache_filename(self, cache):
+        """Return the header cache filename, or None if not caching."""
+        if cache is None:
+            cache = os.environ.get('SWMMTOOLBOX_CACHE')
+        if not cache:
+            return None
+        if cache is True or cache == '1':
+            return '{0}.swmmtoolbox.npz'.format(self.filename)
+        path = os.path.abspath(self.filename).encode('utf-8')
+        return os.path.join(cache,
+                            '{0}.npz'.format(hashlib.sha1(path).hexdigest()))
+
+    def _cache_key(self):
+        """Identify this exact output file for the header cache."""
+        stat = os.fstat(self.fp.fileno())
+        mtime = getattr(stat, 'st_mtime_ns', int(stat.st_mtime * 1e9))
+        return np.array([_CACHE_VERSION,
+                         stat.st_size,
+                         mtime,
+                         self.magic[0],
+                         self.magic[1],
+                         self.Namesstartpos,
+                         self.offset0,
+                         self.startpos,
+                         self.swmm_nperiods], dtype='int64')
+
+    def _save_cache(self, cachefile):
+        """Write the parsed header to 'cachefile', ignoring failures."""
+        arrays = {'key': self._cache_key(),
+                  'header': np.array([self.version,
+                                      self.swmm_flowunits,
+                                      self.swmm_nsubcatch,
+                                      self.swmm_nnodes,
+                                      self.swmm_nlinks,
+                                      self.swmm_npolluts,
+                                      self.reportinterval], dtype='int64'),
+                  'startdate': np.array(self.startdate, dtype='f8'),
+                  'pollutant_codes': np.array(self.pollutant_codes,
+                                              dtype='int32')}
+        for key in [0, 1, 2, 3]:
+            arrays['names{0}'.format(key)] = np.array(self.names[key],
+                                                      dtype='U')
+        for key in [0, 1, 2]:
+            arrays['propcode{0}'.format(key)] = np.array(self.propcode[key],
+                                                         dtype='int32')
+            arrays['properties{0}'.format(key)] = self.properties[key]
+        for key in [0, 1, 2, 4]:
+            arrays['vars{0}'.format(key)] = np.array(self.vars[key],
+                                                     dtype='int32')
+        # Unique to each thread and process writing the same cache.
+        tmpfile = None
+        try:
+            handle, tmpfile = tempfile.mkstemp(
+                prefix=os.path.basename(cachefile) + '.',
+                suffix='.tmp',
+                dir=os.path.dirname(cachefile) or os.curdir)
+            with os.fdopen(handle, 'wb') as fp:
+                np.savez(fp, **arrays)
+            # mkstemp makes the file private, a shared cache is readable.
+            os.chmod(tmpfile, 0o644)
+            os.replace(tmpfile, cachefile)
+        except (IOError, OSError):
+            try:
+                if tmpfile is not None:
+                    os.remove(tmpfile)
+            except OSError:
+                pass
+
+    @_phase('header')
+    def _load_cache(self, cachefile):
+        """Set the header from 'cachefile' if it matches this file."""
+        try:
+            with np.load(cachefile, allow_pickle=False) as cached:
+                if not np.array_equal(cached['key'], self._cache_key()):
+                    return False
+                (self.version,
+                 self.swmm_flowunits,
+                 self.swmm_nsubcatch,
+                 self.swmm_nnodes,
+                 self.swmm_nlinks,
+                 self.swmm_npolluts,
+                 self.reportinterval) = cached['header'].tolist()
+                self.startdate = float(cached['startdate'])
+                pollutant_codes = tuple(cached['pollutant_codes'].tolist())
+                names = {}
+                for key in [0, 1, 2, 3]:
+                    names[key] = cached['names{0}'.format(key)].tolist()
+                self.propcode = {}
+                self._properties = {}
+                for key in [0, 1, 2]:
+                    self.propcode[key] = tuple(
+                        cached['propcode{0}'.format(key)].tolist())
+                    self._properties[key] = cached[
+                        'properties{0}'.format(key)]
+                self.vars = {3: [0]}
+                for key in [0, 1, 2, 4]:
+                    self.vars[key] = tuple(
+                        cached['vars{0}'.format(key)].tolist())
+        except (IOError, OSError, EOFError, KeyError, ValueError,
+                zipfile.BadZipFile):
+            # A missing, stale, or damaged cache is parsed again.
+            return False
+        self.swmm_nsubcatchvars = len(self.vars[0])
+        self.nnodevars = len(self.vars[1])
+        self.nlinkvars = len(self.vars[2])
+        self.nsystemvars = len(self.vars[4])
+        self._set_names(names, pollutant_codes)
+        return True
+
+    @_phase('header')
+    def _read_header(self):
+        """Parse names, properties, and variable codes from the file.
+
+        The header is parsed from a read-only map of the file, with one
+        'np.frombuffer' for each table of codes and properties instead
+        of a read for every element.
+        """
+        self.profile.count(mmaps=1)
+        with mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            self._parse_prologue(buf)
+            names, pollutant_codes, pos = self._parse_names(buf)
+            if self.offset0 is None:
+                self.offset0 = pos
+            pos = self._parse_properties(buf)
+            self._parse_vars(buf, pos)
+        self._set_names(names, pollutant_codes)
+
+    @_phase('header')
+    def _read_layout(self):
+        """Parse only what is needed to locate the results.
+
+        Used by lazy mode.  The property tables are stepped over using
+        their sizes, and the names and properties are parsed on first
+        use.
+        """
+        self.profile.count(mmaps=1)
+        with mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            self._parse_prologue(buf)
+            pos = self.offset0
+            self.propcode = {}
+            for key, count in enumerate(self._counts()[:3]):
+                nprop = self._ints(buf, pos, 1)[0]
+                self.propcode[key] = tuple(
+                    self._ints(buf, pos + self.RECORDSIZE, nprop))
+                pos += (nprop + 1 + count * nprop) * self.RECORDSIZE
+            self._parse_vars(buf, pos)
+
+    @_phase('header')
+    def _read_section(self, parse):
+        """Parse one section of the header on first use."""
+        self.profile.count(mmaps=1)
+        with mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            parse(buf)
+
+    def _counts(self):
+        return [self.swmm_nsubcatch,
+                self.swmm_nnodes,
+                self.swmm_nlinks,
+                self.swmm_npolluts]
+
+    @staticmethod
+    def _records(buf, dtype, count, pos):
+        """Array of 'count' records at 'pos' of 'buf', without copying."""
+        dtype = np.dtype(dtype)
+        if pos + count * dtype.itemsize > len(buf):
+            raise struct.error('The header is truncated.')
+        return np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+
+    def _ints(self, buf, pos, count):
+        return self._records(buf, 'i4', count, pos).tolist()
+
+    def _parse_prologue(self, buf):
+        (self.version,
+         self.swmm_flowunits,
+         self.swmm_nsubcatch,
+         self.swmm_nnodes,
+         self.swmm_nlinks,
+         self.swmm_npolluts) = struct.unpack_from('6i', buf, self.RECORDSIZE)
+
+    def _parse_names(self, buf):
+        """Return the names, the pollutant codes, and the end position."""
+        # Each name is a length and then the characters.
+        pos = self.Namesstartpos
+        names = {}
+        for key, count in enumerate(self._counts()):
+            names[key] = []
+            for _ in range(count):
+                size = struct.unpack_from('i', buf, pos)[0]
+                # Why would SMMM allow spaces in names?  Anyway...
+                names[key].append(buf[pos + self.RECORDSIZE:
+                                      pos + self.RECORDSIZE + size].decode(
+                                          'ascii', 'replace'))
+                pos += self.RECORDSIZE + size
+
+        # Read pollutant concentration codes
+        # = Number of pollutants * 4 byte integers
+        pollutant_codes = tuple(self._ints(buf, pos, self.swmm_npolluts))
+        return (names,
+                pollutant_codes,
+                pos + self.swmm_npolluts * self.RECORDSIZE)
+
+    def _load_names(self, buf):
+        names, pollutant_codes, _ = self._parse_names(buf)
+        self._set_names(names, pollutant_codes)
+
+    def _set_names(self, names, pollutant_codes):
+        # System vars do not have names per se, but made names = number
+        # labels.
+        names[4] = [self._basevarcode()[4][i] for i in self.vars[4]]
+        self._pollutant_codes = pollutant_codes
+        self._names = names
+
+    def _parse_properties(self, buf):
+        """Parse the property tables, returning the end."""
+        # Each property table is the number of properties, their codes,
+        # and then one record per element.
+        pos = self.offset0
+        propcode = {}
+        properties = {}
+        for key, count in enumerate(self._counts()[:3]):
+            nprop = self._ints(buf, pos, 1)[0]
+            propcode[key] = tuple(self._ints(buf, pos + self.RECORDSIZE,
+                                             nprop))
+            pos += (nprop + 1) * self.RECORDSIZE
+            properties[key] = self._records(
+                buf,
+                self._property_dtype(key, propcode[key]),
+                count,
+                pos).copy()
+            pos += count * nprop * self.RECORDSIZE
+        self.propcode = propcode
+        self._properties = properties
+        return pos
+
+    def _parse_vars(self, buf, pos):
+        """Parse the variable codes, start date, and report interval."""
+        self.vars = {}
+        for key in [0, 1, 2, 4]:
+            nvars = self._ints(buf, pos, 1)[0]
+            self.vars[key] = tuple(self._ints(buf, pos + self.RECORDSIZE,
+                                              nvars))
+            pos += (nvars + 1) * self.RECORDSIZE
+        self.vars[3] = [0]
+        self.swmm_nsubcatchvars = len(self.vars[0])
+        self.nnodevars = len(self.vars[1])
+        self.nlinkvars = len(self.vars[2])
+        self.nsystemvars = len(self.vars[4])
+
+        self.startdate = struct.unpack_from('d', buf, pos)[0]
+        self.reportinterval = struct.unpack_from('i', buf, pos + 8)[0]
+        pos += 3 * self.RECORDSIZE
+
+        if self.startpos is None:
+            self.startpos = pos
+
+    def _basevarcode(self):
+        """The variable code table for the version of SWMM."""
+        if self.version < 5100:
+            return VARCODE_OLD
+        return VARCODE
+
+    @property
+    def names(self):
+        """Names of the elements of each type, parsed on first use."""
+        if self._names is None:
+            self._read_section(self._load_names)
+        return self._names
+
+    @property
+    def pollutant_codes(self):
+        """Concentration unit codes of the pollutants."""
+        if self._names is None:
+            self._read_section(self._load_names)
+        return self._pollutant_codes
+
+    @property
+    def properties(self):
+        """Property tables of subcatchments, nodes, and links.
+
+        One record array per type with one record per element, parsed
+        on first use.
+        """
+        if self._properties is None:
+            self._read_section(self._parse_properties)
+        return self._properties
+
+    @property
+    def name_index(self):
+        """Name to position for each type.
+
+        Built in reverse so that a duplicated name resolves to its first
+        occurrence like list.index.
+        """
+        if self._name_index is None:
+            name_index = {}
+            for key, names in self.names.items():
+                name_index[key] = dict(zip(reversed(names),
+                                           range(len(names) - 1, -1, -1)))
+            self._name_index = name_index
+        return self._name_index
+
+    @property
+    def varcode(self):
+        """Variable names by code for each type.
+
+        A copy per file, complete with the pollutant names, so that
+        nothing changes it once built.
+        """
+        if self._varcode is None:
+            base = self._basevarcode()
+            varcode = {}
+            for typenumber in base:
+                start = len(base[typenumber])
+                varcode[typenumber] = dict(base[typenumber])
+                varcode[typenumber].update(
+                    zip(range(start, start + len(self.names[3])),
+                        self.names[3]))
+            self._varcode = varcode
+        return self._varcode
+
+    def _property_dtype(self, key, propcode):
+        """Record dtype of the property table of a type.
+
+        Fields are named from PROPCODE, with '.1' appended to the second
+        use of a name like the upstream and downstream link offsets.
+        Nodes and links start with the integer type code and every other
+        property is a float.
+        """
+        fields = []
+        names = []
+        for code in propcode:
+            name = PROPCODE.get(key, {}).get(code, str(code))
+            if name in names:
+                name = '{0}.{1}'.format(name, names.count(name))
+            names.append(name.split('.')[0])
+            if key != 0 and not fields:
+                kind = 'i4'
+            else:
+                kind = 'f4'
+            fields.append((name, kind))
+        return np.dtype(fields)
+
+    @property
+    def prop(self):
+        """Properties of each element as lists of (code, value) tuples.
+
+        Built on first use from the record arrays in 'properties'.
+        """
+        if self._prop is None:
+            self._prop = dict(
+                (key, [list(zip(self.propcode[key], values))
+                       for values in self.properties[key].tolist()])
+                for key in self.properties)
+        return self._prop
+
+    @property
+    def results(self):
+        """Structured array over the memory mapped results section.
+
+        Each record is one reporting period with the fields 'date',
+        'subcatchment', 'node', 'link', and 'system'.  Nothing is read
+        until the array is indexed, and indexing a field returns a view,
+        so a single series is a strided column of the file, for example::
+
+            obj.results['link'][:, itemindex, variableindex]
+
+        """
+        if self._results is None:
+            with self._lock:
+                if self._results is None:
+                    self.profile.count(mmaps=1)
+                    self._mmap = mmap.mmap(self.fp.fileno(), 0,
+                                           access=mmap.ACCESS_READ)
+                    size = (self.startpos +
+                            self.swmm_nperiods * self.bytesperperiod)
+                    if len(self._mmap) < size:
+                        raise ValueError('''
+*
+*   "{0}" is {1} bytes, too short for its {2} periods of {3} bytes.
+*
+'''.format(self.filename,
+                           len(self._mmap),
+                           self.swmm_nperiods,
+                           self.bytesperperiod))
+                    self._results = np.ndarray(shape=(self.swmm_nperiods,),
+                                               dtype=self.record_dtype,
+                                               buffer=self._mmap,
+                                               offset=self.startpos)
+        return self._results
+
+    def get_series(self, itemtype, name, variableindex):
+        """Return a zero-copy view of one time series."""
+        typenumber = self.type_check(itemtype)
+        if typenumber not in [0, 1, 2, 4]:
+            raise ValueError('''
+*
+*   Type must be one of subcatchment (0), node (1). link (2), or system (4).
+*   You gave "{0}".
+*
+'''.format(itemtype))
+        if typenumber == 4:
+            return self.results['system'][:, int(variableindex)]
+        _, itemindex = self.name_check(typenumber, name)
+        return self.results[self.itemlist[typenumber]][:,
+                                                       itemindex,
+                                                       int(variableindex)]
+
+    @property
+    def flat(self):
+        """Two dimensional float32 view of the results section.
+
+        One row per period and one column per RECORDSIZE word of the
+        period record; the columns for each label come from
+        'get_offsets'.
+        """
+        return self.results.view(np.float32).reshape(
+            self.swmm_nperiods, self.bytesperperiod // self.RECORDSIZE)
+
+    def get_type_array(self, itemtype, start=0, end=None):
+        """Return every series of a type as a 3-D array.
+
+        The array has the shape (periods, elements, variables) and is a
+        view of the memory mapped file, so nothing is copied or read
+        until it is used.  Returns the array with the matching list of
+        element names and list of variable names.  The system is one
+        element named 'system'.
+        """
+        typenumber = self.type_check(itemtype)
+        if typenumber not in self.varsperitem:
+            raise ValueError('''
+*
+*   Type must be one of subcatchment (0), node (1). link (2), or system (4).
+*   You gave "{0}".
+*
+'''.format(itemtype))
+        self.update_var_code(typenumber)
+        variables = [self.varcode[typenumber][i]
+                     for i in range(self.varsperitem[typenumber])]
+        values = self.results[self.itemlist[typenumber]][start:end]
+        if typenumber == 4:
+            return values[:, np.newaxis, :], ['system'], variables
+        return values, list(self.names[typenumber]), variables
+
+    def type_labels(self, itemtype):
+        """Return (type, name, variableindex) labels for a whole type."""
+        typenumber = self.type_check(itemtype)
+        if typenumber == 4:
+            return [(typenumber, name, i)
+                    for i, name in enumerate(self.names[4])]
+        return [(typenumber, name, i)
+                for name in self.names[typenumber]
+                for i in range(self.varsperitem.get(typenumber, 0))]
+
+    def resolve(self, labels):
+        """Validate and resolve many labels at once.
+
+        Each label is either a 'TYPE,NAME,VARINDEX' string or an
+        equivalent sequence, where NAME and VARINDEX can be '*' for every
+        element or variable of the type.  Returns a list of (typenumber,
+        name, itemindex, variableindex) tuples in label order.  Every label
+        that cannot be resolved is reported together in one ValueError
+        instead of failing on the first.
+        """
+        labels = list(labels)
+        resolved = []
+        problems = []
+        for label in labels:
+            try:
+                label = label.split(',')
+            except AttributeError:
+                pass
+            try:
+                itemtype, name, variableindex = label
+            except ValueError:
+                problems.append('"{0}" is not "TYPE,NAME,VARINDEX"'.format(
+                    ','.join(str(i) for i in label)))
+                continue
+            try:
+                typenumber = self.type_check(itemtype)
+            except ValueError:
+                typenumber = None
+            if typenumber not in self.varsperitem:
+                problems.append('type "{0}" must be one of {1}'.format(
+                    itemtype, [self.itemlist[i] for i in self.varsperitem]))
+                continue
+            nvars = self.varsperitem[typenumber]
+            if variableindex == '*':
+                variables = list(range(nvars))
+            else:
+                try:
+                    vindex = int(variableindex)
+                except ValueError:
+                    vindex = -1
+                if not 0 <= vindex < nvars:
+                    problems.append(
+                        'variable index "{0}" for {1} must be between 0 '
+                        'and {2}'.format(variableindex, name, nvars - 1))
+                    continue
+                variables = [vindex]
+            if name != '*':
+                if name not in self.name_index[typenumber]:
+                    problems.append('{0} was not found in "{1}" list'.format(
+                        name, itemtype))
+                    continue
+                names = [name]
+            elif typenumber == 4:
+                # System series are named after their variable.
+                names = None
+            else:
+                names = self.names[typenumber]
+            if names is None:
+                pairs = [(self.names[4][i], i) for i in variables]
+            else:
+                pairs = [(j, i) for j in names for i in variables]
+            for name, vindex in pairs:
+                resolved.append((typenumber,
+                                 name,
+                                 self.name_index[typenumber][name],
+                                 vindex))
+        if problems:
+            raise ValueError("""
+*
+*   {0} of {1} labels could not be resolved:
+*   {2}
+*
+""".format(len(problems), len(labels), '\n*   '.join(problems)))
+        return resolved
+
+    @_phase('labels')
+    def get_offsets(self, labels):
+        """Resolve labels to their column in the flat period records.
+
+        Returns the integer array of columns and the matching list of
+        column headings.  See 'resolve' for the accepted labels.
+        """
+        resolved = self.resolve(labels)
+        for typenumber in set(i[0] for i in resolved):
+            self.update_var_code(typenumber)
+        columns = []
+        headings = []
+        for typenumber, name, itemindex, variableindex in resolved:
+            if typenumber == 4:
+                itemindex = 0
+            columns.append(self.typestart[typenumber] +
+                           itemindex * self.varsperitem[typenumber] +
+                           variableindex)
+            headings.append('{0}_{1}_{2}'.format(
+                self.itemlist[typenumber],
+                name,
+                self.varcode[typenumber][variableindex]))
+        return np.array(columns, dtype=np.intp), headings
+
+    @_phase('read')
+    def get_values(self, columns, start=0, end=None, workers=None):
+        """Gather the given columns for periods start to end.
+
+        All requested values for a block of periods are pulled in one
+        vectorized gather from the memory mapped file, which only copies
+        the requested columns.  Returns a float32 array of shape
+        (periods, columns).
+
+        With 'workers' greater than one the periods are split into that
+        many shards that are read with positional reads by a pool of
+        threads, each one filling its rows of the preallocated result.
+        """
+        if end is None:
+            end = self.swmm_nperiods
+        if self.series is not None:
+            # Series-major companion: each column is one contiguous read.
+            self.profile.count(bytes_mapped=(end - start) * len(columns) *
+                               self.RECORDSIZE)
+            return self.series[np.asarray(columns) - 2, start:end].T
+        if workers is None or int(workers) < 2 or end - start < 2:
+            self.profile.count(bytes_mapped=(end - start) *
+                               self.bytesperperiod)
+            # Fancy indexing gathers straight from the map, where
+            # 'np.take' would first copy every full record of the range.
+            return self.flat[start:end, columns]
+
+        columns = np.asarray(columns, dtype=np.intp)
+        result = np.empty((end - start, len(columns)), dtype='f4')
+        workers = min(int(workers), end - start)
+        edges = np.linspace(start, end, workers + 1).astype('int64')
+        # Bound the memory of the raw period records read at once.
+        block = max(1, self.chunk_periods() // workers)
+
+        def shard(first, last):
+            for lo in range(first, last, block):
+                hi = min(lo + block, last)
+                result[lo - start:hi - start] = \
+                    self._read_periods(lo, hi)[:, columns]
+
+        with ThreadPoolExecutor(workers) as pool:
+            for future in [pool.submit(shard, edges[i], edges[i + 1])
+                           for i in range(workers)]:
+                future.result()
+        return result
+
+    def _read_periods(self, start, end):
+        """Read the records of periods start to end as a 2-D array."""
+        buf = self._pread((end - start) * self.bytesperperiod,
+                          self.startpos + start * self.bytesperperiod)
+        return np.frombuffer(buf, dtype='f4').reshape(
+            end - start, self.bytesperperiod // self.RECORDSIZE)
+
+    def _pread(self, nbytes, offset):
+        """Read nbytes at offset without using the file position.
+
+        Uses 'os.pread', which also releases the GIL, or a slice of the
+        shared read-only memory map where it is not available, so any
+        number of threads can read through one instance.
+        """
+        if hasattr(os, 'pread'):
+            buf = os.pread(self.fp.fileno(), nbytes, offset)
+        else:
+            # The memory map is created with 'results'.
+            self.results
+            buf = self._mmap[offset:offset + nbytes]
+        self.profile.count(reads=1, bytes_read=len(buf))
+        if len(buf) != nbytes:
+            raise ValueError('''
+*
+*   Could only read {0} of {1} bytes at offset {2} of "{3}".
+*
+'''.format(len(buf), nbytes, offset, self.filename))
+        return buf
+
+    def _read_at(self, offset, whence, nbytes):
+        """Seek 'fp' and read nbytes, counting both in the profile."""
+        self.fp.seek(offset, whence)
+        buf = self.fp.read(nbytes)
+        self.profile.count(seeks=1, reads=1, bytes_read=len(buf))
+        return buf
+
+    def refresh(self):
+        """Update the number of periods of a followed file.
+
+        Only the size of the file and, once SWMM has finished, its
+        trailer are read, without moving the position of 'fp'.  Returns
+        the number of new periods.
+        """
+        if not self.follow or self.complete:
+            return 0
+        size = os.fstat(self.fp.fileno()).st_size
+        nperiods = (size - self.startpos) // self.bytesperperiod
+        if size - self.startpos - nperiods * self.bytesperperiod == \
+                6 * self.RECORDSIZE:
+            trailer = struct.unpack('6i',
+                                    self._pread(6 * self.RECORDSIZE,
+                                                size - 6 * self.RECORDSIZE))
+            if trailer[5] == 516114522 and trailer[3] == nperiods:
+                self.complete = True
+                self.magic = (self.magic[0], trailer[5])
+        new = nperiods - self.swmm_nperiods
+        if new > 0:
+            self.swmm_nperiods = nperiods
+            # Mapped for the old size, so map again when next used.
+            self._results = None
+            self._mmap = None
+        return max(new, 0)
+
+    def poll(self, labels, dataframe=True):
+        """Return the periods written since the last poll.
+
+        Reads only the new period records.  The first call returns every
+        period written so far.  Returns a DataFrame indexed by date, or
+        a float32 array of shape (periods, labels) if 'dataframe' is
+        False.
+        """
+        self.refresh()
+        columns, headings = self.get_offsets(labels)
+        start = self._polled
+        nperiods = self.swmm_nperiods - start
+        buf = self._pread(nperiods * self.bytesperperiod,
+                          self.startpos + start * self.bytesperperiod)
+        records = np.frombuffer(buf, dtype=self.record_dtype)
+        flat = np.frombuffer(buf, dtype=np.float32).reshape(
+            nperiods, self.bytesperperiod // self.RECORDSIZE)
+        values = np.take(flat, columns, axis=1)
+        self._polled = start + nperiods
+        if dataframe:
+            import pandas as pd
+
+            return pd.DataFrame(values,
+                                index=_to_datetime(records['date']),
+                                columns=headings)
+        return values
+
+    def follow_periods(self, labels, interval=1.0, timeout=None,
+                       dataframe=True):
+        """Yield each new period of a followed file as it is written.
+
+        Polls every 'interval' seconds and stops once SWMM has written
+        the trailer, or when nothing new arrived for 'timeout' seconds.
+        Each item is a one row DataFrame, or a float32 array of the
+        labels if 'dataframe' is False.
+        """
+        waited = 0.0
+        while True:
+            block = self.poll(labels, dataframe=dataframe)
+            for i in range(len(block)):
+                if dataframe:
+                    yield block.iloc[i:i + 1]
+                else:
+                    yield block[i]
+            if len(block):
+                waited = 0.0
+            elif self.complete or not self.follow:
+                return
+            elif timeout is not None and waited >= timeout:
+                return
+            else:
+                time.sleep(interval)
+                waited += interval
+
+    def chunk_periods(self):
+        """Number of periods that fit in one streaming block."""
+        return max(1, _CHUNK_BYTES // self.bytesperperiod)
+
+    def _transposed_header(self):
+        """Header that ties a series-major companion to this file."""
+        stat = os.fstat(self.fp.fileno())
+        mtime = getattr(stat, 'st_mtime_ns', int(stat.st_mtime * 1e9))
+        return struct.pack(_TRANSPOSED_HEADER,
+                           _TRANSPOSED_MAGIC,
+                           _TRANSPOSED_VERSION,
+                           self.bytesperperiod // self.RECORDSIZE - 2,
+                           self.swmm_nperiods,
+                           self.startpos,
+                           stat.st_size,
+                           mtime).ljust(_TRANSPOSED_HEADERSIZE, b'\0')
+
+    @property
+    def series(self):
+        """Series-major view of the results, or None.
+
+        Available when a current companion file written by 'transpose'
+        is next to the output file.  Row 'i' is the contiguous series of
+        column 'i + 2' of the flat period records.
+        """
+        if self._series is None:
+            self._series = self._open_series()
+        if self._series is False:
+            return None
+        return self._series
+
+    def _open_series(self):
+        """Map a current companion file, or return False if there is none.
+
+        False remembers that there is no usable companion.
+        """
+        tfilename = _transposed_filename(self.filename)
+        try:
+            with open(tfilename, 'rb') as fp:
+                header = fp.read(_TRANSPOSED_HEADERSIZE)
+        except (IOError, OSError):
+            return False
+        self.profile.count(reads=1, bytes_read=len(header))
+        if header != self._transposed_header():
+            return False
+        self.profile.count(mmaps=1)
+        return np.memmap(tfilename,
+                         dtype='f4',
+                         mode='r',
+                         offset=_TRANSPOSED_HEADERSIZE,
+                         shape=(self.bytesperperiod // self.RECORDSIZE - 2,
+                                self.swmm_nperiods))
+
+    def write_transposed(self, outfile=None):
+        """Write the series-major companion file in one streaming pass.
+
+        Blocks of periods are read in time order and scattered to each
+        series, so memory is bounded by the block size.  Written next to
+        the output file unless 'outfile' is given, in which case it has
+        to be moved there to be picked up automatically.
+        """
+        if outfile is None:
+            outfile = _transposed_filename(self.filename)
+        ncolumns = self.bytesperperiod // self.RECORDSIZE - 2
+        # Unique to each thread and process writing the same companion.
+        handle, tmpfile = tempfile.mkstemp(
+            prefix=os.path.basename(outfile) + '.',
+            suffix='.tmp',
+            dir=os.path.dirname(outfile) or os.curdir)
+        try:
+            with os.fdopen(handle, 'wb') as fp:
+                fp.write(self._transposed_header())
+                fp.truncate(_TRANSPOSED_HEADERSIZE +
+                            ncolumns * self.swmm_nperiods * self.RECORDSIZE)
+            # mkstemp makes the file private, a companion is shared.
+            os.chmod(tmpfile, 0o644)
+            series = np.memmap(tmpfile,
+                               dtype='f4',
+                               mode='r+',
+                               offset=_TRANSPOSED_HEADERSIZE,
+                               shape=(ncolumns, self.swmm_nperiods))
+            step = self.chunk_periods()
+            for start in range(0, self.swmm_nperiods, step):
+                end = min(start + step, self.swmm_nperiods)
+                series[:, start:end] = self.flat[start:end, 2:].T
+            series.flush()
+            del series
+            os.replace(tmpfile, outfile)
+        except BaseException:
+            os.remove(tmpfile)
+            raise
+        self._series = None
+        return outfile
+
+    def check_compatible(self, other):
+        """Raise ValueError unless 'other' has the same structure.
+
+        The two files must have the same element names, variables,
+        start date, report interval, and number of periods, so that the
+        same columns and periods can be read from both.
+        """
+        problems = []
+        for typenumber in [0, 1, 2, 3]:
+            if self.names[typenumber] != other.names[typenumber]:
+                problems.append('the {0} names differ'.format(
+                    self.itemlist[typenumber]))
+        for typenumber in [0, 1, 2, 4]:
+            if tuple(self.vars[typenumber]) != tuple(other.vars[typenumber]):
+                problems.append('the {0} variables differ'.format(
+                    self.itemlist[typenumber]))
+        for attr in ['startdate', 'reportinterval', 'swmm_nperiods']:
+            if getattr(self, attr) != getattr(other, attr):
+                problems.append('{0} is {1} and {2}'.format(
+                    attr, getattr(self, attr), getattr(other, attr)))
+        if problems:
+            raise ValueError('''
+*
+*   "{0}" and "{1}" are not compatible:
+*   {2}
+*
+'''.format(self.filename, other.filename, '\n*   '.join(problems)))
+
+    @_phase('dates')
+    def get_period_range(self,
+                         start_date=None,
+                         end_date=None,
+                         start_period=None,
+                         end_period=None):
+        """Return the (start, end) range of periods inside a window.
+
+        The range is half open and computed directly from 'startdate'
+        and 'reportinterval', so nothing is read from the results.  The
+        dates and period indices are inclusive bounds and any of them can
+        be None to leave that side open.
+        """
+        start = 0
+        end = self.swmm_nperiods
+        interval = self.reportinterval.total_seconds()
+        # Period 'i' is reported at startdate + (i + 1) * reportinterval.
+        if start_date is not None:
+            elapsed = (_to_pydatetime(start_date) -
+                       self.startdate).total_seconds()
+            start = max(start, int(math.ceil(elapsed / interval - 1e-6)) - 1)
+        if end_date is not None:
+            elapsed = (_to_pydatetime(end_date) -
+                       self.startdate).total_seconds()
+            end = min(end, int(math.floor(elapsed / interval + 1e-6)))
+        if start_period is not None:
+            start = max(start, int(start_period))
+        if end_period is not None:
+            end = min(end, int(end_period) + 1)
+        start = min(max(start, 0), self.swmm_nperiods)
+        end = max(start, end)
+        return start, end
+
+    def iter_chunks(self, labels, chunk_periods=10000, dataframe=True,
+                    start=0, end=None):
+        """Yield the labeled series in blocks of consecutive periods.
+
+        Labels are resolved once, then each block of at most
+        'chunk_periods' periods is gathered and yielded in time order, so
+        peak memory depends on the block size and not on the length of
+        the simulation.
+
+        Parameters
+        ----------
+        labels
+            Labels accepted by 'resolve'.
+        chunk_periods : int
+            Number of periods in each block.
+        dataframe : bool
+            If True yield DataFrames indexed by date, otherwise yield
+            float32 arrays of shape (periods, labels).
+        start, end : int
+            Half open range of periods to iterate over, for example from
+            'get_period_range'.  Defaults to all periods.
+        """
+        chunk_periods = int(chunk_periods)
+        if chunk_periods < 1:
+            raise ValueError('''
+*
+*   The "chunk_periods" argument must be a positive integer.
+*   You gave "{0}".
+*
+'''.format(chunk_periods))
+        if end is None:
+            end = self.swmm_nperiods
+        columns, headings = self.get_offsets(labels)
+        for first in range(start, end, chunk_periods):
+            last = min(first + chunk_periods, end)
+            values = self.get_values(columns, first, last)
+            if dataframe:
+                import pandas as pd
+
+                yield pd.DataFrame(
+                    values,
+                    index=self.get_time_index(first, last),
+                    columns=headings)
+            else:
+                yield values
+
+    @_phase('dates')
+    def get_time_index(self, start=0, end=None):
+        """Return the DatetimeIndex of the periods from start to end.
+
+        Period 'i' is reported at startdate + (i + 1) * reportinterval, as
+        in 'get_period_range', so the dates are computed for just the
+        periods asked for and no period record is read.
+        """
+        import pandas as pd
+
+        start, end, _ = slice(start, end).indices(self.swmm_nperiods)
+        seconds = int(self.reportinterval.total_seconds())
+        dates = (np.datetime64(self.startdate, 's') +
+                 np.arange(start + 1, max(start, end) + 1, dtype='int64') *
+                 np.timedelta64(seconds, 's'))
+        return pd.DatetimeIndex(dates.astype('datetime64[ns]'))
+
+    @_phase('resample')
+    def get_resampled(self, columns, freq, how=('mean',), start=0, end=None,
+                      chunk_periods=None, workers=None):
+        """Aggregate the columns to a coarser fixed frequency while reading.
+
+        Blocks of periods are reduced into the output bins as they are
+        read, so memory depends on the number of bins and not on the
+        number of periods.  Since the report interval is fixed the bin of
+        every period is computed from its index without decoding any
+        dates.  Bins without any period are NaN, except for 'sum' and
+        'count' which are zero.
+
+        Parameters
+        ----------
+        columns
+            Columns of 'flat', for example from 'get_offsets'.
+        freq : str
+            Fixed frequency accepted by 'pandas.to_timedelta'.
+        how : sequence of str
+            Aggregations from 'mean', 'min', 'max', 'sum', and 'count'.
+        start, end : int
+            Half open range of periods to read.  Defaults to all periods.
+        chunk_periods : int
+            Number of periods read at a time.
+        workers : int
+            Number of threads reading each block, see 'get_values'.
+
+        Returns
+        -------
+        (index, values) with the DatetimeIndex of the bins and a
+        dictionary of float64 arrays of shape (bins, columns) by
+        aggregation.
+        """
+        import pandas as pd
+
+        for agg in how:
+            if agg not in _RESAMPLE_HOW:
+                raise ValueError('''
+*
+*   The aggregation "{0}" must be one of {1}.
+*
+'''.format(agg, _RESAMPLE_HOW))
+        try:
+            width = int(pd.to_timedelta(freq).total_seconds())
+        except ValueError:
+            width = 0
+        if width < 1:
+            raise ValueError('''
+*
+*   The "resample" frequency "{0}" must be a fixed frequency of at
+*   least a second, for example '15min', '1h', or '1D'.
+*
+'''.format(freq))
+        if end is None:
+            end = self.swmm_nperiods
+        columns = np.asarray(columns, dtype=np.intp)
+        if chunk_periods is None:
+            chunk_periods = max(1, min(
+                _CHUNK_BYTES // (8 * max(1, len(columns))),
+                self.chunk_periods()))
+        chunk_periods = int(chunk_periods)
+
+        # Bins start at midnight of the first period read, like the
+        # 'start_day' origin of pandas 'resample'.  Period 'i' is reported
+        # 'offset + i * interval' seconds after that midnight.
+        day = datetime.datetime.combine(
+            (self.startdate + (start + 1) * self.reportinterval).date(),
+            datetime.time())
+        interval = int(self.reportinterval.total_seconds())
+        offset = int((self.startdate - day).total_seconds()) + interval
+        firstbin = (offset + start * interval) // width
+        nbins = 0
+        if end > start:
+            nbins = (offset + (end - 1) * interval) // width - firstbin + 1
+        index = pd.DatetimeIndex(
+            pd.Timestamp(day) +
+            pd.to_timedelta((firstbin + np.arange(nbins)) * width, unit='s'))
+
+        counts = np.zeros(nbins, dtype='int64')
+        sums = np.zeros((nbins, len(columns)))
+        mins = np.full((nbins, len(columns)), np.inf)
+        maxs = np.full((nbins, len(columns)), -np.inf)
+        for first in range(start, end, chunk_periods):
+            last = min(first + chunk_periods, end)
+            values = self.get_values(columns, first, last,
+                                     workers=workers)
+            bins = ((offset + np.arange(first, last) * interval) // width -
+                    firstbin)
+            # Periods of a bin are consecutive, so each bin is one
+            # segment of the block.
+            edges = np.concatenate(
+                [[0], np.flatnonzero(np.diff(bins)) + 1])
+            rows = bins[edges]
+            counts[rows] += np.diff(np.append(edges, len(bins)))
+            if 'sum' in how or 'mean' in how:
+                sums[rows] += np.add.reduceat(values, edges, axis=0,
+                                              dtype='float64')
+            if 'min' in how:
+                mins[rows] = np.minimum(
+                    mins[rows], np.minimum.reduceat(values, edges, axis=0))
+            if 'max' in how:
+                maxs[rows] = np.maximum(
+                    maxs[rows], np.maximum.reduceat(values, edges, axis=0))
+
+        empty = counts == 0
+        result = {}
+        for agg in how:
+            if agg == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[agg] = sums / counts[:, np.newaxis]
+            elif agg == 'sum':
+                result[agg] = sums
+            elif agg == 'count':
+                result[agg] = np.repeat(
+                    counts[:, np.newaxis].astype('float64'),
+                    len(columns),
+                    axis=1)
+            else:
+                result[agg] = (mins if agg == 'min' else maxs).copy()
+                result[agg][empty] = np.nan
+        return index, result
+
     def update_var_code(self, typenumber):
-        start = len(self.varcode[typenumber])
-        end = start + len(self.names[3])
-        nlabels = list(range(start, end))
-        ndict = dict(list(zip(nlabels, self.names[3])))
-        self.varcode[typenumber].update(ndict)
+        """Return the variable codes of a type.
+
+        Kept for compatibility, 'varcode' already includes the pollutant
+        names of every type.
+        """
+        return self.varcode[typenumber]
 
     def type_check(self, itemtype):
         if itemtype in [0, 1, 2, 3, 4]:
@@ -349,10 +1861,10 @@ class SwmmExtract(object):
         return typenumber
 
     def name_check(self, itemtype, itemname):
-        self.itemtype = self.type_check(itemtype)
+        typenumber = self.type_check(itemtype)
         try:
-            itemindex = self.names[self.itemtype].index(itemname)
-        except (ValueError, KeyError):
+            itemindex = self.name_index[typenumber][itemname]
+        except KeyError:
             raise ValueError('''
 *
 *   {0} was not found in "{1}" list.
@@ -372,58 +1884,35 @@ class SwmmExtract(object):
         _, itemindex = self.name_check(itemtype, name)
 
         date_offset = self.startpos + period * self.bytesperperiod
-
-        self.fp.seek(date_offset, 0)
-        date = struct.unpack('d', self.fp.read(2 * self.RECORDSIZE))[0]
-
-        offset = date_offset + 2 * self.RECORDSIZE  # skip the date
-
-        if itemtype == 0:
-            offset = offset + self.RECORDSIZE * (
-                itemindex * self.swmm_nsubcatchvars)
-        if itemtype == 1:
-            offset = offset + self.RECORDSIZE * (
-                self.swmm_nsubcatch * self.swmm_nsubcatchvars +
-                itemindex * self.nnodevars)
-        elif itemtype == 2:
-            offset = offset + self.RECORDSIZE * (
-                self.swmm_nsubcatch * self.swmm_nsubcatchvars +
-                self.swmm_nnodes * self.nnodevars +
-                itemindex * self.nlinkvars)
-        elif itemtype == 4:
-            offset = offset + self.RECORDSIZE * (
-                self.swmm_nsubcatch * self.swmm_nsubcatchvars +
-                self.swmm_nnodes * self.nnodevars +
-                self.swmm_nlinks * self.nlinkvars)
-
-        offset = offset + self.RECORDSIZE * variableindex
-
-        self.fp.seek(offset, 0)
-        value = struct.unpack('f', self.fp.read(self.RECORDSIZE))[0]
+        date = struct.unpack('d', self._pread(2 * self.RECORDSIZE,
+                                              date_offset))[0]
+
+        if itemtype == 4:
+            # The system has a single item.
+            itemindex = 0
+        offset = date_offset + self.RECORDSIZE * (
+            self.typestart[itemtype] +
+            itemindex * self.varsperitem[itemtype] +
+            int(variableindex))
+        value = struct.unpack('f', self._pread(self.RECORDSIZE, offset))[0]
         return (date, value)
 
     def get_dates(self):
         """Return start and end date tuple."""
-        begindate = datetime.datetime(1899, 12, 30)
-        ntimes = list(range(self.swmm_nperiods))
-        periods = [ntimes[0], ntimes[-1]]
-        st_end = []
-        for period in periods:
-            date_offset = self.startpos + period * self.bytesperperiod
-            self.fp.seek(date_offset, 0)
-            day = struct.unpack('d', self.fp.read(2 * self.RECORDSIZE))[0]
-            st_end.append(begindate + datetime.timedelta(days=int(day)))
-        return st_end
-
-
-@mando.command()
+        index = self.get_time_index()
+        return [i.normalize().to_pydatetime() for i in (index[0], index[-1])]
+
+
+@_command()
 def about():
     """Display version number and system information."""
+    from tstoolbox import tsutils
+
     tsutils.about(__name__)
 
 
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
 def catalog(filename, itemtype='', tablefmt='simple', header='default'):
     """List the catalog of objects in output file
 
@@ -435,25 +1924,27 @@ def catalog(filename, itemtype='', tablefmt='simple', header='default'):
     {header}
 
     """
-    obj = SwmmExtract(filename)
-    if itemtype:
-        typenumber = obj.type_check(itemtype)
-        plist = [typenumber]
-    else:
-        plist = list(range(len(obj.itemlist)))
-    if header == 'default':
-        header = ['TYPE', 'NAME']
-    collect = []
-    for i in plist:
-        for oname in obj.names[i]:
-            collect.append([obj.itemlist[i], oname])
-    return tsutils.printiso(collect,
-                            tablefmt=tablefmt,
-                            headers=header)
-
+    from tstoolbox import tsutils
 
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
+    with SwmmExtract(filename) as obj:
+        if itemtype:
+            typenumber = obj.type_check(itemtype)
+            plist = [typenumber]
+        else:
+            plist = list(range(len(obj.itemlist)))
+        if header == 'default':
+            header = ['TYPE', 'NAME']
+        collect = []
+        for i in plist:
+            for oname in obj.names[i]:
+                collect.append([obj.itemlist[i], oname])
+        return tsutils.printiso(collect,
+                                tablefmt=tablefmt,
+                                headers=header)
+
+
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
 def listdetail(filename,
                itemtype,
                name='',
@@ -472,42 +1963,45 @@ def listdetail(filename,
     {header}
 
     """
-    obj = SwmmExtract(filename)
-    typenumber = obj.type_check(itemtype)
-    if name:
-        objectlist = [obj.name_check(itemtype, name)[0]]
-    else:
-        objectlist = obj.names[typenumber]
-
-    propnumbers = obj.propcode[typenumber]
-    if header == "default":
-        header = ['#Name'] + [PROPCODE[typenumber][i] for i in propnumbers]
+    import pandas as pd
+    from tstoolbox import tsutils
 
-    collect = []
-    for i, oname in enumerate(objectlist):
-        printvar = [oname]
-        for j in obj.prop[typenumber][i]:
-            if j[0] == 0:
-                printvar.append(TYPECODE[typenumber][j[1]])
-            else:
-                printvar.append(j[1])
-        collect.append(printvar)
-    df = pd.DataFrame(collect)
-    cheader = []
-    for head in header:
-        if head not in cheader:
-            cheader.append(head)
+    with SwmmExtract(filename) as obj:
+        typenumber = obj.type_check(itemtype)
+        if name:
+            objectlist, itemindex = obj.name_check(itemtype, name)
+            objectlist = [objectlist]
+            props = obj.properties[typenumber][[itemindex]]
         else:
-            cnt = cheader.count(head)
-            cheader.append('{0}.{1}'.format(head, cnt))
-    df.columns = cheader
-    return tsutils.printiso(df,
-                            tablefmt=tablefmt,
-                            headers=header)
+            objectlist = obj.names[typenumber]
+            props = obj.properties[typenumber]
+
+        propnumbers = obj.propcode[typenumber]
+        if header == "default":
+            header = ['#Name'] + [PROPCODE[typenumber][i] for i in propnumbers]
+
+        df = pd.DataFrame(dict((j, props[i].astype('float64')
+                                if props[i].dtype.kind == 'f' else props[i])
+                               for j, i in enumerate(props.dtype.names)))
+        if 0 in propnumbers:
+            code = df.columns[propnumbers.index(0)]
+            df[code] = df[code].map(TYPECODE[typenumber])
+        df.insert(0, 'name', objectlist)
+        cheader = []
+        for head in header:
+            if head not in cheader:
+                cheader.append(head)
+            else:
+                cnt = cheader.count(head)
+                cheader.append('{0}.{1}'.format(head, cnt))
+        df.columns = cheader
+        return tsutils.printiso(df,
+                                tablefmt=tablefmt,
+                                headers=header)
 
 
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
 def listvariables(filename, tablefmt='csv_nos', header='default'):
     """List variables available for each type.
 
@@ -520,33 +2014,757 @@ def listvariables(filename, tablefmt='csv_nos', header='default'):
     {header}
 
     """
-    obj = SwmmExtract(filename)
-    if header == 'default':
-        header = ['TYPE', 'DESCRIPTION', 'VARINDEX']
-    # 'pollutant' really isn't it's own itemtype
-    # but part of subcatchment, node, and link...
+    from tstoolbox import tsutils
+
+    with SwmmExtract(filename) as obj:
+        if header == 'default':
+            header = ['TYPE', 'DESCRIPTION', 'VARINDEX']
+        # 'pollutant' really isn't it's own itemtype
+        # but part of subcatchment, node, and link...
+        collect = []
+        for itemtype in ['subcatchment', 'node', 'link', 'system']:
+            typenumber = obj.type_check(itemtype)
+
+            obj.update_var_code(typenumber)
+
+            for i in obj.vars[typenumber]:
+                try:
+                    collect.append([itemtype,
+                                    obj.varcode[typenumber][i].decode(),
+                                    i])
+                except (TypeError, AttributeError):
+                    collect.append([itemtype,
+                                    str(obj.varcode[typenumber][i]),
+                                    str(i)])
+        return tsutils.printiso(collect,
+                                tablefmt=tablefmt,
+                                headers=header)
+
+
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def transpose(filename, outfile=None):
+    """Write a series-major companion file for fast single-series reads.
+
+    The SWMM output file stores all values of one reporting period
+    together, so reading one series touches the whole file.  This
+    writes every series contiguously to 'FILENAME.swmmtoolbox.series',
+    which is then used automatically by all of the extraction commands
+    while the output file is unchanged.
+
+    Parameters
+    ----------
+    {filename}
+    outfile : str
+        Optional filename to write to instead of next to the output
+        file.
+
+    """
+    with SwmmExtract(filename) as obj:
+        return obj.write_transposed(outfile=outfile)
+
+
+def _select_labels(obj, labels, itemtype):
+    """Combine labels with every series of the comma separated types."""
+    labels = list(labels)
+    if itemtype:
+        for itype in itemtype.split(','):
+            labels.extend(obj.type_labels(itype))
+    if not labels:
+        for typenumber in [0, 1, 2, 4]:
+            labels.extend(obj.type_labels(typenumber))
+    return labels
+
+
+def _series_table(obj, labels):
+    """Return a DataFrame describing each labeled series."""
+    import pandas as pd
+
     collect = []
-    for itemtype in ['subcatchment', 'node', 'link', 'system']:
-        typenumber = obj.type_check(itemtype)
+    for typenumber, name, _, variableindex in obj.resolve(labels):
+        obj.update_var_code(typenumber)
+        collect.append([obj.itemlist[typenumber],
+                        name,
+                        str(obj.varcode[typenumber][variableindex])])
+    return pd.DataFrame(collect, columns=['TYPE', 'NAME', 'VARIABLE'])
+
+
+# Output formats of 'export' and the filename extensions that select them.
+_EXPORT_FORMATS = {'.parquet': 'parquet',
+                   '.pq': 'parquet',
+                   '.arrow': 'arrow',
+                   '.feather': 'arrow',
+                   '.h5': 'hdf5',
+                   '.hdf5': 'hdf5'}
+
+
+def _export_metadata(obj, labels):
+    """Describe the exported columns and their elements as a dict."""
+    resolved = obj.resolve(labels)
+    columns = []
+    elements = {}
+    for typenumber, name, itemindex, variableindex in resolved:
+        itemtype = obj.itemlist[typenumber]
+        columns.append({'type': itemtype,
+                        'name': name,
+                        'variableindex': variableindex,
+                        'variable': str(obj.varcode[typenumber][
+                            variableindex])})
+        if typenumber == 4 or name in elements.get(itemtype, {}):
+            continue
+        record = obj.properties[typenumber][itemindex]
+        props = dict(zip(record.dtype.names, record.tolist()))
+        if 0 in obj.propcode[typenumber]:
+            code = record.dtype.names[obj.propcode[typenumber].index(0)]
+            props[code] = TYPECODE[typenumber][props[code]]
+        elements.setdefault(itemtype, {})[name] = props
+    return {'source': os.path.basename(obj.filename),
+            'flowunits': _SWMM_FLOWUNITS.get(obj.swmm_flowunits),
+            'startdate': obj.startdate.isoformat(),
+            'reportinterval': obj.reportinterval.total_seconds(),
+            'pollutants': obj.names[3],
+            'columns': columns,
+            'elements': elements}
+
+
+def _export_arrow(chunks, outfile, headings, metadata, fmt):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError('''
+*
+*   Writing "{0}" files requires the "pyarrow" package.
+*
+'''.format(fmt))
+    fields = [pa.field('Datetime', pa.timestamp('ns'))]
+    for heading, column in zip(headings, metadata['columns']):
+        fields.append(pa.field(heading, pa.float32(), metadata={
+            'type': column['type'],
+            'name': column['name'],
+            'variable': column['variable'],
+            'variableindex': str(column['variableindex'])}))
+    schema = pa.schema(fields,
+                       metadata={'swmmtoolbox': json.dumps(metadata)})
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(outfile, schema)
+    else:
+        import pyarrow.ipc as ipc
+        writer = ipc.new_file(outfile, schema)
+    try:
+        for index, values in chunks:
+            arrays = [pa.array(index.values)]
+            arrays.extend(pa.array(values[:, i])
+                          for i in range(values.shape[1]))
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+    finally:
+        writer.close()
 
+
+def _export_hdf5(chunks, outfile, headings, metadata, fmt):
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError('''
+*
+*   Writing "{0}" files requires the "h5py" package.
+*
+'''.format(fmt))
+    strtype = h5py.special_dtype(vlen=str)
+    with h5py.File(outfile, 'w') as h5:
+        h5.attrs['swmmtoolbox'] = json.dumps(metadata)
+        h5.create_dataset('columns', data=headings, dtype=strtype)
+        for key in ['type', 'name', 'variable']:
+            h5.create_dataset(key,
+                              data=[i[key] for i in metadata['columns']],
+                              dtype=strtype)
+        times = h5.create_dataset('Datetime',
+                                  shape=(0,),
+                                  maxshape=(None,),
+                                  dtype='i8',
+                                  chunks=True)
+        times.attrs['units'] = 'nanoseconds since 1970-01-01'
+        data = h5.create_dataset('values',
+                                 shape=(0, len(headings)),
+                                 maxshape=(None, len(headings)),
+                                 dtype='f4',
+                                 chunks=True)
+        for index, values in chunks:
+            nrows = data.shape[0]
+            times.resize((nrows + len(index),))
+            times[nrows:] = index.values.astype('datetime64[ns]').view('i8')
+            data.resize((nrows + len(index), len(headings)))
+            data[nrows:] = values
+
+
+# Shared by 'export' and the 'export' command.
+_LOCAL_DOCSTRINGS['export'] = '''\
+Write series to a columnar Parquet, Arrow, or HDF5 file.
+
+    The periods are read and written in blocks, so memory does not grow
+    with the length of the simulation, and values are kept as float32.
+    The names, properties, and variable names of the exported elements
+    are stored in the file as JSON under the 'swmmtoolbox' key of the
+    schema metadata (Parquet and Arrow) or of the root attributes
+    (HDF5).
+
+    Parameters
+    ----------
+    {filename}
+    outfile : str
+        Filename to write.  The format is taken from the extension,
+        '.parquet', '.arrow', '.feather', '.h5', or '.hdf5', unless
+        'fmt' is given.
+    {labels}
+    {itemtypes}
+    fmt : str
+        One of 'parquet', 'arrow', or 'hdf5'.
+    {start_date}
+    {end_date}
+    {chunk_periods}
+
+    '''.format(**_LOCAL_DOCSTRINGS)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def export(filename,
+           outfile,
+           *labels,
+           itemtype=None,
+           fmt=None,
+           start_date=None,
+           end_date=None,
+           chunk_periods=None):
+    """{export}"""
+    if fmt is None:
+        fmt = _EXPORT_FORMATS.get(os.path.splitext(outfile)[1].lower())
+    if fmt not in set(_EXPORT_FORMATS.values()):
+        raise ValueError('''
+*
+*   The export format "{0}" of "{1}" is not supported.
+*   Must be one of {2}.
+*
+'''.format(fmt, outfile, sorted(set(_EXPORT_FORMATS.values()))))
+    with SwmmExtract(filename) as obj:
+        labels = _select_labels(obj, labels, itemtype)
+        # Columnar formats need unique column names, so keep the first of
+        # any repeated series.
+        unique = {}
+        for typenumber, name, _, variableindex in obj.resolve(labels):
+            unique.setdefault((typenumber, name, variableindex),
+                              (typenumber, name, variableindex))
+        labels = list(unique.values())
+        columns, headings = obj.get_offsets(labels)
+        metadata = _export_metadata(obj, labels)
+        start, end = obj.get_period_range(start_date=start_date,
+                                          end_date=end_date)
+        if chunk_periods is None:
+            chunk_periods = obj.chunk_periods()
+        chunk_periods = int(chunk_periods)
+
+        def chunks():
+            for first in range(start, end, chunk_periods):
+                last = min(first + chunk_periods, end)
+                yield (obj.get_time_index(first, last),
+                       obj.get_values(columns, first, last))
+
+        if fmt == 'hdf5':
+            _export_hdf5(chunks(), outfile, headings, metadata, fmt)
+        else:
+            _export_arrow(chunks(), outfile, headings, metadata, fmt)
+
+
+@_command('export', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _export_cli(filename,
+                outfile,
+                itemtype=None,
+                fmt=None,
+                start_date=None,
+                end_date=None,
+                chunk_periods=None,
+                *labels):
+    """{export}"""
+    export(filename,
+           outfile,
+           *labels,
+           itemtype=itemtype,
+           fmt=fmt,
+           start_date=start_date,
+           end_date=end_date,
+           chunk_periods=chunk_periods)
+
+
+# Shared by 'compare' and the 'compare' command.
+_LOCAL_DOCSTRINGS['compare'] = '''\
+Compare the series of two structurally identical output files.
+
+    Both files are read a block of periods at a time, so memory does not
+    depend on the size of the files.  For every series reports the
+    maximum absolute difference, the maximum difference relative to the
+    larger magnitude of the two values, the root mean square
+    difference, and the date of the first period where the difference
+    is larger than 'atol + rtol * abs(value in filename1)', or NaT.
+
+    Parameters
+    ----------
+    filename1 : str
+        Filename of the reference SWMM output file.
+    filename2 : str
+        Filename of the SWMM output file to compare.
+    {labels}
+    {itemtypes}
+    atol : float
+        Absolute tolerance.
+    rtol : float
+        Relative tolerance.
+    {chunk_periods}
+    {tablefmt}
+    {header}
+
+    '''.format(**_LOCAL_DOCSTRINGS)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def compare(filename1,
+            filename2,
+            *labels,
+            itemtype=None,
+            atol=0.0,
+            rtol=0.0,
+            chunk_periods=None,
+            tablefmt='simple',
+            header='default'):
+    """{compare}"""
+    import pandas as pd
+    from tstoolbox import tsutils
+
+    with SwmmExtract(filename1) as obj1, SwmmExtract(filename2) as obj2:
+        obj1.check_compatible(obj2)
+        labels = _select_labels(obj1, labels, itemtype)
+        table = _series_table(obj1, labels)
+        columns, _ = obj1.get_offsets(labels)
+        if chunk_periods is None:
+            chunk_periods = max(1, min(_CHUNK_BYTES // (8 * len(columns)),
+                                       obj1.chunk_periods()))
+        chunk_periods = int(chunk_periods)
+
+        max_abs = np.zeros(len(columns))
+        max_rel = np.zeros(len(columns))
+        sumsq = np.zeros(len(columns))
+        first = np.full(len(columns), -1, dtype='int64')
+        for start in range(0, obj1.swmm_nperiods, chunk_periods):
+            end = min(start + chunk_periods, obj1.swmm_nperiods)
+            values1 = obj1.get_values(columns, start, end).astype('float64')
+            values2 = obj2.get_values(columns, start, end).astype('float64')
+            diff = np.abs(values2 - values1)
+            np.maximum(max_abs, diff.max(axis=0), out=max_abs)
+            scale = np.maximum(np.abs(values1), np.abs(values2))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rel = np.where(scale > 0, diff / scale, 0.0)
+            np.maximum(max_rel, rel.max(axis=0), out=max_rel)
+            sumsq += (diff * diff).sum(axis=0)
+            exceed = diff > atol + rtol * np.abs(values1)
+            found = exceed.any(axis=0) & (first < 0)
+            first[found] = start + exceed[:, found].argmax(axis=0)
+
+        table['MAX_ABS_DIFF'] = max_abs
+        table['MAX_REL_DIFF'] = max_rel
+        table['RMSE'] = np.sqrt(sumsq / obj1.swmm_nperiods)
+        index = obj1.get_time_index()
+        table['FIRST_EXCEEDANCE'] = pd.DatetimeIndex(
+            [index[i] if i >= 0 else pd.NaT for i in first])
+        if header == 'default':
+            header = list(table.columns)
+        return tsutils.printiso(table,
+                                tablefmt=tablefmt,
+                                headers=header)
+
+
+@_command('compare', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _compare_cli(filename1,
+                 filename2,
+                 itemtype=None,
+                 atol=0.0,
+                 rtol=0.0,
+                 chunk_periods=None,
+                 tablefmt='simple',
+                 header='default',
+                 *labels):
+    """{compare}"""
+    return compare(filename1,
+                   filename2,
+                   *labels,
+                   itemtype=itemtype,
+                   atol=atol,
+                   rtol=rtol,
+                   chunk_periods=chunk_periods,
+                   tablefmt=tablefmt,
+                   header=header)
+
+
+# Shared by 'summary' and the 'summary' command.
+_LOCAL_DOCSTRINGS['summary'] = '''\
+Summary statistics of every series from one sequential read.
+
+    Each block of periods updates running accumulators for all series at
+    once, so memory does not depend on the length of the simulation.
+    For every series reports the minimum, maximum, date of the
+    maximum, mean, sum, integral over time (the sum multiplied by the
+    report interval in seconds, for example a volume for a flow), and
+    the number of periods above 'threshold'.
+
+    Parameters
+    ----------
+    {filename}
+    {labels}
+    {itemtypes}
+    threshold : float
+        Value to count the periods above.
+    {start_date}
+    {end_date}
+    {chunk_periods}
+    {tablefmt}
+    {header}
+
+    '''.format(**_LOCAL_DOCSTRINGS)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def summary(filename,
+            *labels,
+            itemtype=None,
+            threshold=0.0,
+            start_date=None,
+            end_date=None,
+            chunk_periods=None,
+            tablefmt='simple',
+            header='default'):
+    """{summary}"""
+    import pandas as pd
+    from tstoolbox import tsutils
+
+    with SwmmExtract(filename) as obj:
+        labels = _select_labels(obj, labels, itemtype)
+        table = _series_table(obj, labels)
+        columns, _ = obj.get_offsets(labels)
+        start, end = obj.get_period_range(start_date=start_date,
+                                          end_date=end_date)
+        if chunk_periods is None:
+            chunk_periods = max(1, min(_CHUNK_BYTES // (8 * len(columns)),
+                                       obj.chunk_periods()))
+        chunk_periods = int(chunk_periods)
+
+        minimum = np.full(len(columns), np.inf)
+        maximum = np.full(len(columns), -np.inf)
+        argmax = np.zeros(len(columns), dtype='int64')
+        total = np.zeros(len(columns))
+        count = np.zeros(len(columns), dtype='int64')
+        for first in range(start, end, chunk_periods):
+            last = min(first + chunk_periods, end)
+            values = obj.get_values(columns, first, last)
+            np.minimum(minimum, values.min(axis=0), out=minimum)
+            blockarg = values.argmax(axis=0)
+            blockmax = values[blockarg, np.arange(len(columns))]
+            # Strictly greater keeps the first period of a repeated maximum.
+            higher = blockmax > maximum
+            maximum[higher] = blockmax[higher]
+            argmax[higher] = first + blockarg[higher]
+            total += values.sum(axis=0, dtype='float64')
+            count += (values > threshold).sum(axis=0)
+
+        nperiods = end - start
+        index = obj.get_time_index()
+        table['MIN'] = minimum if nperiods else np.nan
+        table['MAX'] = maximum if nperiods else np.nan
+        table['MAX_TIME'] = index[argmax] if nperiods else pd.NaT
+        table['MEAN'] = total / nperiods if nperiods else np.nan
+        table['SUM'] = total
+        table['INTEGRAL'] = total * obj.reportinterval.total_seconds()
+        table['COUNT_OVER'] = count
+        if header == 'default':
+            header = list(table.columns)
+        return tsutils.printiso(table,
+                                tablefmt=tablefmt,
+                                headers=header)
+
+
+@_command('summary', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _summary_cli(filename,
+                 itemtype=None,
+                 threshold=0.0,
+                 start_date=None,
+                 end_date=None,
+                 chunk_periods=None,
+                 tablefmt='simple',
+                 header='default',
+                 *labels):
+    """{summary}"""
+    return summary(filename,
+                   *labels,
+                   itemtype=itemtype,
+                   threshold=threshold,
+                   start_date=start_date,
+                   end_date=end_date,
+                   chunk_periods=chunk_periods,
+                   tablefmt=tablefmt,
+                   header=header)
+
+
+# Comparison operators allowed in the rules of 'events'.
+_EVENT_OPERATORS = {'>': np.greater,
+                    '>=': np.greater_equal,
+                    '<': np.less,
+                    '<=': np.less_equal,
+                    '==': np.equal,
+                    '!=': np.not_equal}
+
+_LOCAL_DOCSTRINGS['rules'] = '''rules : str
+        One or more threshold rules, each in the format::
+
+            'TYPE,VARIABLE,OPERATOR,VALUE'
+
+        The rule applies to every element of TYPE.  VARIABLE is the
+        variable name or VARINDEX from 'swmmtoolbox listvariables', and
+        OPERATOR is one of '>', '>=', '<', '<=', '==', or '!='.  For
+        example: 'node,Flow_lost_flooding,>,0 link,Capacity,>=,1'
+        '''
+_LOCAL_DOCSTRINGS['min_duration'] = '''min_duration : str
+        Drop events shorter than this duration, for example '30min'.
+        '''
+_LOCAL_DOCSTRINGS['inter_event_gap'] = '''inter_event_gap : str
+        Merge events of the same series separated by no more than this
+        duration, for example '6h'.
+        '''
+
+
+def _event_rules(obj, rules):
+    """Resolve event rules to labels and per label operators and values."""
+    labels = []
+    operators = []
+    thresholds = []
+    for rule in rules:
+        try:
+            itemtype, variable, operator, value = rule.split(',')
+            value = float(value)
+        except ValueError:
+            raise ValueError('''
+*
+*   The rule "{0}" is not "TYPE,VARIABLE,OPERATOR,VALUE".
+*
+'''.format(rule))
+        if operator not in _EVENT_OPERATORS:
+            raise ValueError('''
+*
+*   The operator "{0}" in rule "{1}" must be one of {2}.
+*
+'''.format(operator, rule, sorted(_EVENT_OPERATORS)))
+        typenumber = obj.type_check(itemtype)
         obj.update_var_code(typenumber)
+        varnames = dict((str(j), i)
+                        for i, j in obj.varcode.get(typenumber, {}).items())
+        variableindex = varnames.get(variable, variable)
+        rulelabels = obj.type_labels(typenumber)
+        rulelabels = [i for i in rulelabels
+                      if str(i[2]) == str(variableindex)]
+        if not rulelabels:
+            raise ValueError('''
+*
+*   The variable "{0}" in rule "{1}" is not available.
+*
+'''.format(variable, rule))
+        labels.extend(rulelabels)
+        operators.extend([operator] * len(rulelabels))
+        thresholds.extend([value] * len(rulelabels))
+    return labels, np.array(operators), np.array(thresholds)
 
-        for i in obj.vars[typenumber]:
-            try:
-                collect.append([itemtype,
-                                obj.varcode[typenumber][i].decode(),
-                                i])
-            except (TypeError, AttributeError):
-                collect.append([itemtype,
-                                str(obj.varcode[typenumber][i]),
-                                str(i)])
-    return tsutils.printiso(collect,
-                            tablefmt=tablefmt,
-                            headers=header)
-
-
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
+
+# Shared by 'events' and the 'events' command.
+_LOCAL_DOCSTRINGS['events'] = '''\
+Find threshold events across the network in a single pass.
+
+    The file is read once a block of periods at a time.  The rule
+    comparison and the start and end of every event are found for all
+    series of a block at once, with the open events carried into the
+    next block.  Returns one row per event with the first and last
+    period meeting the rule, the duration, the peak (maximum) value,
+    and the volume (the sum of the values during the event multiplied
+    by the report interval in seconds).
+
+    Parameters
+    ----------
+    {filename}
+    {rules}
+    {min_duration}
+    {inter_event_gap}
+    {start_date}
+    {end_date}
+    {chunk_periods}
+    {tablefmt}
+    {header}
+
+    '''.format(**_LOCAL_DOCSTRINGS)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def events(filename,
+           *rules,
+           min_duration=None,
+           inter_event_gap=None,
+           start_date=None,
+           end_date=None,
+           chunk_periods=None,
+           tablefmt='simple',
+           header='default'):
+    """{events}"""
+    import pandas as pd
+    from tstoolbox import tsutils
+
+    if not rules:
+        raise ValueError('''
+*
+*   At least one rule "TYPE,VARIABLE,OPERATOR,VALUE" is needed to find
+*   events.
+*
+''')
+    with SwmmExtract(filename) as obj:
+        labels, operators, thresholds = _event_rules(obj, rules)
+        table = _series_table(obj, labels)
+        columns, _ = obj.get_offsets(labels)
+        start, end = obj.get_period_range(start_date=start_date,
+                                          end_date=end_date)
+        if chunk_periods is None:
+            chunk_periods = max(1, min(_CHUNK_BYTES // (8 * len(columns)),
+                                       obj.chunk_periods()))
+        chunk_periods = int(chunk_periods)
+        interval = obj.reportinterval.total_seconds()
+
+        # State of the event still open at the end of the previous block.
+        isopen = np.zeros(len(columns), dtype=bool)
+        openstart = np.zeros(len(columns), dtype='int64')
+        openpeak = np.full(len(columns), -np.inf)
+        opentotal = np.zeros(len(columns))
+        found = []
+        for first in range(start, end, chunk_periods):
+            last = min(first + chunk_periods, end)
+            values = obj.get_values(columns, first, last)
+            meets = np.zeros(values.shape, dtype=bool)
+            for operator in np.unique(operators):
+                select = operators == operator
+                meets[:, select] = _EVENT_OPERATORS[operator](
+                    values[:, select], thresholds[select])
+            previous = np.vstack([isopen[np.newaxis, :], meets[:-1]])
+            startrows, startcols = np.nonzero(meets & ~previous)
+            endrows, endcols = np.nonzero(~meets & previous)
+            active = set(startcols.tolist()) | set(endcols.tolist())
+            # Events open through the whole block only need their peak and
+            # total updated.
+            through = isopen & meets.all(axis=0)
+            through[list(active)] = False
+            if through.any():
+                openpeak[through] = np.maximum(openpeak[through],
+                                               values[:, through].max(axis=0))
+                opentotal[through] += values[:, through].sum(axis=0,
+                                                             dtype='float64')
+            for col in active:
+                starts = startrows[startcols == col].tolist()
+                ends = endrows[endcols == col].tolist()
+                if isopen[col]:
+                    starts.insert(0, None)
+                if meets[-1, col]:
+                    ends.append(None)
+                for segstart, segend in zip(starts, ends):
+                    segment = values[segstart or 0:segend, col]
+                    if segstart is None:
+                        # An event closed by the first period of the block
+                        # leaves an empty segment.
+                        peak = max(openpeak[col], segment.max(initial=-np.inf))
+                        total = opentotal[col] + segment.sum(dtype='float64')
+                        evstart = openstart[col]
+                    else:
+                        peak = segment.max()
+                        total = segment.sum(dtype='float64')
+                        evstart = first + segstart
+                    if segend is None:
+                        isopen[col] = True
+                        openstart[col] = evstart
+                        openpeak[col] = peak
+                        opentotal[col] = total
+                    else:
+                        isopen[col] = False
+                        found.append((col, evstart, first + segend - 1,
+                                      peak, total))
+        for col in np.nonzero(isopen)[0]:
+            found.append((col, openstart[col], end - 1,
+                          openpeak[col], opentotal[col]))
+
+        # Merge events of a series separated by short gaps, then drop the
+        # short ones.
+        found.sort(key=lambda i: (i[0], i[1]))
+        maxgap = None
+        if inter_event_gap is not None:
+            maxgap = pd.to_timedelta(inter_event_gap).total_seconds()
+        merged = []
+        for event in found:
+            if (maxgap is not None and merged and merged[-1][0] == event[0] and
+                    (event[1] - merged[-1][2] - 1) * interval <= maxgap):
+                col, evstart, _, peak, total = merged[-1]
+                merged[-1] = (col, evstart, event[2],
+                              max(peak, event[3]), total + event[4])
+            else:
+                merged.append(event)
+        mindur = 0
+        if min_duration is not None:
+            mindur = pd.to_timedelta(min_duration).total_seconds()
+        merged = [i for i in merged if (i[2] - i[1] + 1) * interval >= mindur]
+
+        index = obj.get_time_index()
+        cols = np.array([i[0] for i in merged], dtype='int64')
+        result = table.iloc[cols].reset_index(drop=True)
+        result['START'] = index[[i[1] for i in merged]]
+        result['END'] = index[[i[2] for i in merged]]
+        result['DURATION'] = pd.to_timedelta(
+            [(i[2] - i[1] + 1) * interval for i in merged], unit='s')
+        result['PEAK'] = [float(i[3]) for i in merged]
+        result['VOLUME'] = [i[4] * interval for i in merged]
+        if header == 'default':
+            header = list(result.columns)
+        return tsutils.printiso(result,
+                                tablefmt=tablefmt,
+                                headers=header)
+
+
+@_command('events', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _events_cli(filename,
+                min_duration=None,
+                inter_event_gap=None,
+                start_date=None,
+                end_date=None,
+                chunk_periods=None,
+                tablefmt='simple',
+                header='default',
+                *rules):
+    """{events}"""
+    return events(filename,
+                  *rules,
+                  min_duration=min_duration,
+                  inter_event_gap=inter_event_gap,
+                  start_date=start_date,
+                  end_date=end_date,
+                  chunk_periods=chunk_periods,
+                  tablefmt=tablefmt,
+                  header=header)
+
+
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
 def stdtoswmm5(start_date=None, end_date=None, input_ts='-'):
     """Take the toolbox standard format and return SWMM5 format.
 
@@ -571,6 +2789,8 @@ def stdtoswmm5(start_date=None, end_date=None, input_ts='-'):
     {end_date}
 
     """
+    from tstoolbox import tsutils
+
     import csv
     sys.tracebacklimit = 1000
     tsd = tsutils.read_iso_ts(input_ts)[start_date:end_date]
@@ -591,183 +2811,730 @@ def stdtoswmm5(start_date=None, end_date=None, input_ts='-'):
         return
 
 
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
+@_command(formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
 def getdata(filename, *labels):
     """DEPRECATED: Use 'extract' instead."""
     return extract(filename, *labels)
 
 
-@mando.command(formatter_class=RSTHelpFormatter, doctype='numpy')
-@tsutils.doc(_LOCAL_DOCSTRINGS)
-def extract(filename, *labels):
+@_doc(_LOCAL_DOCSTRINGS)
+def extract(filename,
+            *labels,
+            start_date=None,
+            end_date=None,
+            start_period=None,
+            end_period=None,
+            resample=None,
+            how='mean',
+            workers=None,
+            profile=None):
     """Get the time series data for a particular object and variable.
 
+    Only the periods between the start and end bounds are read.
+
     Parameters
     ----------
     {filename}
     {labels}
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
+    {workers}
+    {profile}
 
     """
-    obj = SwmmExtract(filename)
-    jtsd = []
-    for label in labels:
-        itemtype, name, variableindex = label.split(',')
-        typenumber = obj.type_check(itemtype)
-        # if itemtype != 'system':
-        name = obj.name_check(itemtype, name)[0]
+    from tstoolbox import tsutils
+
+    with _profiling(profile, 'extract', filename) as record:
+        frame = _extract_frame(filename,
+                               labels,
+                               start_date=start_date,
+                               end_date=end_date,
+                               start_period=start_period,
+                               end_period=end_period,
+                               resample=resample,
+                               how=how,
+                               workers=workers,
+                               profile=record)
+        with record.phase('output'):
+            return tsutils.printiso(frame)
+
+
+@_command('extract', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _extract_cli(filename,
+                 start_date=None,
+                 end_date=None,
+                 start_period=None,
+                 end_period=None,
+                 resample=None,
+                 how='mean',
+                 workers=None,
+                 profile=False,
+                 *labels):
+    """Get the time series data for a particular object and variable.
 
-        obj.update_var_code(typenumber)
+    Only the periods between the start and end bounds are read.
 
-        begindate = datetime.datetime(1899, 12, 30)
-        dates = []
-        values = []
-        for time in range(obj.swmm_nperiods):
-            date, value = obj.get_swmm_results(
-                typenumber, name, int(variableindex), time)
-            days = int(date)
-            seconds = int((date - days) * 86400)
-            extra = seconds % 10
-            if extra != 0:
-                if extra == 9:
-                    seconds = seconds + 1
-                if extra == 1:
-                    seconds = seconds - 1
-            date = begindate + datetime.timedelta(
-                days=days, seconds=seconds)
-            dates.append(date)
-            values.append(value)
-        jtsd.append(pd.DataFrame(
-            pd.Series(values, index=dates),
-            columns=['{0}_{1}_{2}'.format(
-                itemtype, name, obj.varcode[typenumber][int(variableindex)])]))
-    result = pd.concat(jtsd, axis=1, join_axes=[jtsd[0].index])
-    return tsutils.printiso(result)
+    Parameters
+    ----------
+    {filename}
+    {labels}
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
+    {workers}
+    {profile_cli}
 
-def fast_extract(filename, *labels):
+    """
+    # The command line parser passes options positionally, so they have
+    # to come before the labels here.
+    record = Profile(memory=True) if profile else None
+    result = extract(filename,
+                     *labels,
+                     start_date=start_date,
+                     end_date=end_date,
+                     start_period=start_period,
+                     end_period=end_period,
+                     resample=resample,
+                     how=how,
+                     workers=workers,
+                     profile=record)
+    if record is not None:
+        sys.stderr.write('{0}\n'.format(record))
+    return result
+
+
+def _extract_values(filename,
+                    labels,
+                    start_date=None,
+                    end_date=None,
+                    start_period=None,
+                    end_period=None,
+                    resample=None,
+                    how='mean',
+                    workers=None,
+                    profile=_NO_PROFILE):
+    """Resolve the labels once and gather every series in one pass.
+
+    Returns (values, index, headings).  With 'resample' the values are
+    float64 aggregates with one column per label and aggregation, in
+    label order, otherwise the float32 values at every period.  Each
+    phase is recorded in 'profile'.
+    """
+    with profile.phase('header'):
+        obj = SwmmExtract(filename, profile=profile)
+    with obj:
+        columns, headings = obj.get_offsets(labels)
+        start, end = obj.get_period_range(start_date=start_date,
+                                          end_date=end_date,
+                                          start_period=start_period,
+                                          end_period=end_period)
+        if resample is None:
+            values = obj.get_values(columns, start, end, workers=workers)
+            return values, obj.get_time_index(start, end), headings
+        if isinstance(how, str):
+            how = how.split(',')
+        how = [i.strip() for i in how]
+        index, result = obj.get_resampled(columns, resample, how=how,
+                                          start=start, end=end,
+                                          workers=workers)
+        values = np.stack([result[i] for i in how], axis=2)
+        values = values.reshape(len(index), len(columns) * len(how))
+        if len(how) > 1:
+            headings = ['{0}_{1}'.format(i, j) for i in headings for j in how]
+        return values, index, headings
+
+
+def _extract_frame(filename,
+                   labels,
+                   start_date=None,
+                   end_date=None,
+                   start_period=None,
+                   end_period=None,
+                   resample=None,
+                   how='mean',
+                   workers=None,
+                   profile=_NO_PROFILE):
+    """Return the labeled series as a DataFrame indexed by date."""
+    values, index, headings = _extract_values(filename,
+                                              labels,
+                                              start_date=start_date,
+                                              end_date=end_date,
+                                              start_period=start_period,
+                                              end_period=end_period,
+                                              resample=resample,
+                                              how=how,
+                                              workers=workers,
+                                              profile=profile)
+    with profile.phase('frame'):
+        import pandas as pd
+
+        return pd.DataFrame(values, index=index, columns=headings)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def fast_extract(filename,
+                 *labels,
+                 start_date=None,
+                 end_date=None,
+                 start_period=None,
+                 end_period=None,
+                 resample=None,
+                 how='mean',
+                 workers=None,
+                 profile=None):
     """Get the time series data for a particular object and variable.
 
     Parameters
     ----------
     {filename}
     {labels}
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
+    {workers}
+    {profile}
 
     """
-    obj = SwmmExtract(filename)
-    begindate = datetime.datetime(1899, 12, 30)
-    namemap = {
-        0 : 'subcatchment',
-        1 : 'node',
-        2 : 'link',
-        4 : 'system'
-    }
-    typemap = {
-        0 : 0,
-        1 : int(obj.RECORDSIZE * obj.swmm_nsubcatch * obj.swmm_nsubcatchvars),
-        2 : int(obj.RECORDSIZE * obj.swmm_nsubcatch * obj.swmm_nsubcatchvars +
-                obj.RECORDSIZE * obj.swmm_nnodes * obj.nnodevars),
-        4 : int(obj.RECORDSIZE * obj.swmm_nsubcatch * obj.swmm_nsubcatchvars +
-                obj.RECORDSIZE * obj.swmm_nnodes * obj.nnodevars +
-                obj.RECORDSIZE * obj.swmm_nlinks * obj.nlinkvars),
-    }
-    varmap = {
-        0 : obj.swmm_nsubcatchvars,
-        1 : obj.nnodevars,
-        2 : obj.nlinkvars,
-        4 : obj.nsystemvars,
-    }
-    labels = pd.Series(labels).str.split(',')
-    itypename = labels.str[0]
-    item_names = labels.str[1].values
-    varix = labels.str[2].astype(int)
-    itypes = itypename.map({v: k for k, v in namemap.items()}).values
-    itemindices = []
-    for dtype, name in zip(itypes, item_names):
-        _, itemindex = obj.name_check(dtype, name)
-        itemindices.append(itemindex)
-    item_name_map = pd.Series(item_names, index=itemindices)
-    item_name_map = item_name_map[~item_name_map.index.duplicated(keep='first')]
-    items = pd.np.asarray(itemindices)
-    periods = pd.np.arange(obj.swmm_nperiods + 1)
-    date_offsets = obj.startpos + periods * obj.bytesperperiod
-    offsets = date_offsets + 2 * obj.RECORDSIZE
-    type_offsets = pd.Series(itypes).map(typemap).values
-    item_offsets = items * pd.Series(itypes).map(varmap).values * obj.RECORDSIZE
-    var_offsets = varix * obj.RECORDSIZE
-    all_offsets = type_offsets + item_offsets + var_offsets
-    bool_mask = pd.np.zeros(obj.bytesperperiod - 2).astype(bool)
-    record_mask = bool_mask.copy()
-    record_mask[all_offsets] = 1
-    for i in range(obj.RECORDSIZE):
-        bool_mask[all_offsets + i] = 1
-    ts = []
-    for start_ix, end_ix in zip(periods[:-1], periods[:-1] + 1):
-        mmap_offset = (mmap.ALLOCATIONGRANULARITY *
-                       math.floor(offsets[start_ix] /
-                                  mmap.ALLOCATIONGRANULARITY))
-        mmap_endpoint = offsets[end_ix] - 2
-        mmap_length = mmap_endpoint - mmap_offset
-        assert((mmap_offset % mmap.ALLOCATIONGRANULARITY) == 0)
-        mmap_start_gap = offsets[start_ix] - mmap_offset
-        mmap_end_gap = mmap_endpoint - (offsets[end_ix] - 2)
-        mmap_bool_mask = pd.np.pad(bool_mask, pad_width=(mmap_start_gap, mmap_end_gap),
-                                   mode='constant', constant_values=0)
-        mmap_fp = mmap.mmap(obj.fp.fileno(), prot=mmap.PROT_READ,
-                            length=mmap_length, offset=mmap_offset)
-        records = pd.np.array(mmap_fp)[mmap_bool_mask].reshape(-1, obj.RECORDSIZE)
-        records = records.view(dtype=pd.np.float32).ravel()
-        ts.append(records)
-    dates = []
-    for date in date_offsets[:-1]:
-        obj.fp.seek(date, 0)
-        date = struct.unpack('d', obj.fp.read(2 * obj.RECORDSIZE))[0]
-        dates.append(date)
-    record_order = (pd.DataFrame(pd.np.column_stack([itypes, items, varix]))
-                    .sort_values(by=[0,1,2]))
-    record_type_names = record_order[0].map(namemap).astype(str)
-    record_item_names = record_order[1].map(item_name_map).astype(str)
-    record_var_names = pd.concat([record_order[2][record_order[0] == i]
-                                  .map(VARCODE[i]) for i in
-                                VARCODE]).sort_index().astype(str)
-    headings = record_type_names + '_' + record_item_names + '_' + record_var_names
-    date_index = pd.to_datetime(dates, unit='d', origin=begindate)
-    result = pd.DataFrame(pd.np.vstack(ts), index=date_index, columns=headings)
-    return result
-
-@tsutils.doc(_LOCAL_DOCSTRINGS)
-def extract_arr(filename, *labels):
+    with _profiling(profile, 'fast_extract', filename) as record:
+        return _extract_frame(filename,
+                              labels,
+                              start_date=start_date,
+                              end_date=end_date,
+                              start_period=start_period,
+                              end_period=end_period,
+                              resample=resample,
+                              how=how,
+                              workers=workers,
+                              profile=record)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def extract_arr(filename,
+                *labels,
+                start_date=None,
+                end_date=None,
+                start_period=None,
+                end_period=None,
+                resample=None,
+                how='mean',
+                workers=None,
+                profile=None):
     """Same as extract except it returns the raw numpy array.
 
-    Available only within Python API
+    Available only within Python API.  A single label returns a one
+    dimensional array, otherwise the array has one column per label, or
+    one per label and aggregation with 'resample'.
 
     Parameters
     ----------
     {filename}
     {labels}
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
+    {workers}
+    {profile}
 
     """
-    obj = SwmmExtract(filename)
-    for label in labels:
-        itemtype, name, variableindex = label.split(',')
-        typenumber = obj.type_check(itemtype)
-        if itemtype != 'system':
-            name = obj.name_check(itemtype, name)[0]
+    with _profiling(profile, 'extract_arr', filename) as record:
+        data, _, _ = _extract_values(filename,
+                                     labels,
+                                     start_date=start_date,
+                                     end_date=end_date,
+                                     start_period=start_period,
+                                     end_period=end_period,
+                                     resample=resample,
+                                     how=how,
+                                     workers=workers,
+                                     profile=record)
+        with record.phase('output'):
+            data = data.astype('float64')
+            if data.shape[1] == 1:
+                return data[:, 0]
+            return data
+
+
+def _files_and_labels(arguments):
+    """Split command line arguments into output files and labels.
+
+    Arguments in the label format 'TYPE,NAME,VARINDEX' are labels unless
+    they name an existing file, and every other argument must be an
+    existing output file.
+    """
+    filenames = []
+    labels = []
+    for argument in arguments:
+        if len(argument.split(',')) == 3 and not os.path.isfile(argument):
+            labels.append(argument)
+        else:
+            filenames.append(argument)
+    missing = [i for i in filenames if not os.path.isfile(i)]
+    if missing:
+        raise ValueError('''
+*
+*   The output files {0} do not exist.  Labels must be in the format
+*   'TYPE,NAME,VARINDEX'.
+*
+'''.format(', '.join('"{0}"'.format(i) for i in missing)))
+    return filenames, labels
 
-        obj.update_var_code(typenumber)
 
-        data = pd.np.zeros(len(list(range(obj.swmm_nperiods))))
+# Labels and options shared by every 'batch_extract' worker, set once per
+# worker process by '_batch_init' instead of being sent with each file.
+_BATCH_OPTIONS = {}
+
 
-        for time in range(obj.swmm_nperiods):
-            _, value = obj.get_swmm_results(typenumber,
-                                            name,
-                                            int(variableindex),
-                                            time)
-            data[time] = value
+def _batch_init(labels, options):
+    _BATCH_OPTIONS['labels'] = labels
+    _BATCH_OPTIONS['options'] = options
+
+
+def _batch_worker(filename):
+    """Extract the shared labels from one file in a worker process.
+
+    Only numpy arrays and the headings are sent back, which pickle as
+    raw buffers, or with 'outdir' just the name of the file written.
+    """
+    import pandas as pd
+
+    options = dict(_BATCH_OPTIONS['options'])
+    outfile = options.pop('outfile', {}).get(filename)
+    values, index, headings = _extract_values(filename,
+                                              _BATCH_OPTIONS['labels'],
+                                              **options)
+    if outfile is not None:
+        pd.DataFrame(values, index=index, columns=headings).to_csv(outfile)
+        return filename, outfile
+    return filename, (values, np.asarray(index), headings)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def batch_extract(filenames,
+                  *labels,
+                  jobs=None,
+                  combine=False,
+                  outdir=None,
+                  start_date=None,
+                  end_date=None,
+                  start_period=None,
+                  end_period=None,
+                  resample=None,
+                  how='mean'):
+    """Extract the same labels from many output files in parallel.
+
+    Each file is opened and read in a separate worker process.  The
+    labels and options are sent to each worker once and the results
+    come back as numpy arrays rather than DataFrames.
+
+    Parameters
+    ----------
+    filenames : list
+        Filenames of the SWMM output files.
+    {labels}
+    jobs : int
+        Number of worker processes.  Defaults to the number of CPUs.
+        With 1 the files are read in this process.
+    combine : bool
+        If True return a single DataFrame with the columns of every file
+        named 'FILENAME:COLUMN', otherwise a dictionary of DataFrames by
+        filename.
+    outdir : str
+        If given, each worker writes its result to a CSV file in this
+        directory, named after the output file, and a dictionary of the
+        written filenames by filename is returned instead.
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
 
-    return data
+    """
+    import pandas as pd
+
+    filenames = list(filenames)
+    options = {'start_date': start_date,
+               'end_date': end_date,
+               'start_period': start_period,
+               'end_period': end_period,
+               'resample': resample,
+               'how': how}
+    if outdir is not None:
+        outfiles = {}
+        for filename in filenames:
+            outfile = os.path.join(
+                outdir,
+                os.path.splitext(os.path.basename(filename))[0] + '.csv')
+            if outfile in outfiles.values():
+                raise ValueError('''
+*
+*   More than one input file would be written to "{0}".
+*
+'''.format(outfile))
+            outfiles[filename] = outfile
+        options['outfile'] = outfiles
+
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, min(int(jobs), len(filenames)))
+    if jobs == 1:
+        _batch_init(labels, options)
+        results = [_batch_worker(i) for i in filenames]
+    else:
+        pool = multiprocessing.Pool(jobs,
+                                    initializer=_batch_init,
+                                    initargs=(labels, options))
+        try:
+            results = pool.map(_batch_worker, filenames, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    if outdir is not None:
+        return dict(results)
+    frames = dict((filename,
+                   pd.DataFrame(values, index=pd.DatetimeIndex(index),
+                                columns=headings))
+                  for filename, (values, index, headings) in results)
+    if not combine:
+        return frames
+    return pd.concat([frames[i].add_prefix(i + ':') for i in filenames],
+                     axis=1)
+
+
+@_command('batch-extract',
+               formatter_class=_RSTHelpFormatter,
+               doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _batch_extract_cli(jobs=None,
+                       outdir=None,
+                       start_date=None,
+                       end_date=None,
+                       start_period=None,
+                       end_period=None,
+                       resample=None,
+                       how='mean',
+                       *files_and_labels):
+    """Extract the same labels from many output files in parallel.
+
+    Each file is opened and read in a separate worker process.  Prints
+    every series of every file side by side with the columns named
+    'FILENAME:COLUMN', or with 'outdir' writes one CSV file per output
+    file and prints the names of the files written.
+
+    Parameters
+    ----------
+    {files_and_labels}
+    jobs : int
+        Number of worker processes.  Defaults to the number of CPUs.
+    outdir : str
+        If given, write the result of each file to a CSV file in this
+        directory, named after the output file.
+    {start_date}
+    {end_date}
+    {start_period}
+    {end_period}
+    {resample}
+    {how}
+
+    """
+    import pandas as pd
+    from tstoolbox import tsutils
+
+    filenames, labels = _files_and_labels(files_and_labels)
+    result = batch_extract(filenames,
+                           *labels,
+                           jobs=jobs,
+                           combine=outdir is None,
+                           outdir=outdir,
+                           start_date=start_date,
+                           end_date=end_date,
+                           start_period=start_period,
+                           end_period=end_period,
+                           resample=resample,
+                           how=how)
+    if outdir is not None:
+        result = pd.DataFrame({'FILENAME': list(result.keys()),
+                               'OUTFILE': list(result.values())})
+        return tsutils.printiso(result,
+                                headers=list(result.columns))
+    return tsutils.printiso(result)
+
+
+@_doc(_LOCAL_DOCSTRINGS)
+def ensemble(filenames,
+             *labels,
+             percentiles=None,
+             start_date=None,
+             end_date=None,
+             chunk_periods=None,
+             profile=None):
+    """Statistics of each period across an ensemble of output files.
+
+    Every file must have the same elements, variables, and time base as
+    the first.  Blocks of periods are then read from each file in turn
+    into running sums, minimums, and maximums.  Exact percentiles are
+    computed over one block of all the files at a time, with the block
+    size chosen so that the block of every file fits in about 64 MB.
+    Only one file is open at a time, so memory does not grow with the
+    number of files.  The blocks are read through 'SwmmExtract', so a
+    series-major companion file written by 'transpose' is used.
+
+    Parameters
+    ----------
+    filenames : list
+        Filenames of the SWMM output files of the ensemble members.
+    {labels}
+    percentiles : str
+        Comma separated list of percentiles from 0 to 100, for example
+        '5,50,95', to compute in addition to the mean, min, and max.
+    {start_date}
+    {end_date}
+    {chunk_periods}
+    {profile}
+
+    Returns
+    -------
+    A DataFrame indexed by date with the columns 'COLUMN_mean',
+    'COLUMN_min', 'COLUMN_max', and 'COLUMN_pNN' for each label.
+
+    """
+    import pandas as pd
+
+    filenames = list(filenames)
+    if not filenames:
+        raise ValueError('''
+*
+*   The ensemble needs at least one output file.
+*
+''')
+    if not labels:
+        raise ValueError('''
+*
+*   The ensemble needs at least one label 'TYPE,NAME,VARINDEX'.
+*
+''')
+    if isinstance(percentiles, str):
+        percentiles = percentiles.split(',')
+    percentiles = [float(i) for i in (percentiles or [])]
+    for value in percentiles:
+        if not 0 <= value <= 100:
+            raise ValueError('''
+*
+*   The percentiles must be between 0 and 100.  You gave "{0}".
+*
+'''.format(value))
+
+    with _profiling(profile, 'ensemble', filenames[0]) as record:
+        with record.phase('header'):
+            obj = SwmmExtract(filenames[0], profile=record)
+        with obj:
+            columns, headings = obj.get_offsets(labels)
+            start, end = obj.get_period_range(start_date=start_date,
+                                              end_date=end_date)
+            for filename in filenames[1:]:
+                with record.phase('header'):
+                    other = SwmmExtract(filename, profile=record)
+                with other:
+                    obj.check_compatible(other)
+
+            if chunk_periods is None:
+                nmembers = len(filenames) if percentiles else 1
+                chunk_periods = _CHUNK_BYTES // (4 * len(columns) * nmembers)
+                chunk_periods = min(chunk_periods, obj.chunk_periods())
+            chunk_periods = max(1, int(chunk_periods))
+
+            stats = ['mean', 'min', 'max'] + ['p{0:g}'.format(i)
+                                              for i in percentiles]
+            result = np.empty((end - start, len(columns), len(stats)))
+            for first in range(start, end, chunk_periods):
+                last = min(first + chunk_periods, end)
+                total = np.zeros((last - first, len(columns)))
+                low = np.full((last - first, len(columns)), np.inf)
+                high = np.full((last - first, len(columns)), -np.inf)
+                if percentiles:
+                    members = np.empty(
+                        (len(filenames), last - first, len(columns)),
+                        dtype='f4')
+                for number, filename in enumerate(filenames):
+                    # Reopened for each block so that only one member is
+                    # open at a time, lazily since the header was checked.
+                    with record.phase('header'):
+                        member = SwmmExtract(filename,
+                                             lazy=True,
+                                             profile=record)
+                    with member:
+                        values = member.get_values(columns, first, last)
+                    total += values
+                    np.minimum(low, values, out=low)
+                    np.maximum(high, values, out=high)
+                    if percentiles:
+                        members[number] = values
+                rows = slice(first - start, last - start)
+                result[rows, :, 0] = total / len(filenames)
+                result[rows, :, 1] = low
+                result[rows, :, 2] = high
+                if percentiles:
+                    result[rows, :, 3:] = np.moveaxis(
+                        np.percentile(members, percentiles, axis=0), 0, -1)
+
+            index = obj.get_time_index(start, end)
+        with record.phase('frame'):
+            return pd.DataFrame(result.reshape(end - start, -1),
+                                index=index,
+                                columns=['{0}_{1}'.format(i, j)
+                                         for i in headings for j in stats])
+
+
+@_command('ensemble', formatter_class=_RSTHelpFormatter, doctype='numpy')
+@_doc(_LOCAL_DOCSTRINGS)
+def _ensemble_cli(percentiles=None,
+                  start_date=None,
+                  end_date=None,
+                  chunk_periods=None,
+                  *files_and_labels):
+    """Statistics of each period across an ensemble of output files.
+
+    Every file must have the same elements, variables, and time base.
+    Prints the mean, min, max, and any percentiles of each label across
+    the files at every period.
+
+    Parameters
+    ----------
+    {files_and_labels}
+    percentiles : str
+        Comma separated list of percentiles from 0 to 100, for example
+        '5,50,95', to compute in addition to the mean, min, and max.
+    {start_date}
+    {end_date}
+    {chunk_periods}
+
+    """
+    from tstoolbox import tsutils
+
+    filenames, labels = _files_and_labels(files_and_labels)
+    return tsutils.printiso(ensemble(filenames,
+                                     *labels,
+                                     percentiles=percentiles,
+                                     start_date=start_date,
+                                     end_date=end_date,
+                                     chunk_periods=chunk_periods))
+
+
+def open_dataset(filename, itemtype=None):
+    """Open the output file as lazily memory mapped xarray Datasets.
+
+    Available only within Python API.  Each item type is a Dataset with
+    the dimensions ('time', 'element') and one data variable per
+    variable of the type.  The data variables are views of the memory
+    mapped file, so '.sel()' and '.isel()' only read the selected
+    slices.  The time coordinate is computed from the start date and
+    report interval and the element properties are coordinates along
+    'element', so opening costs about the same as reading the header.
+
+    The Datasets share one open file, which is closed when the last of
+    them is closed with '.close()' or a 'with' block.
+
+    Parameters
+    ----------
+    filename : str
+        Filename of SWMM output file.
+    itemtype : str
+        One of 'subcatchment', 'node', 'link', or 'system' to return
+        only that Dataset.  By default returns a dict of the Datasets of
+        every type keyed by type.
+
+    """
+    import pandas as pd
+
+    try:
+        import xarray as xr
+    except ImportError:
+        raise ImportError('''
+*
+*   The "open_dataset" function requires the "xarray" package.
+*
+''')
+    obj = SwmmExtract(filename)
+    index = pd.date_range(start=obj.startdate + obj.reportinterval,
+                          periods=obj.swmm_nperiods,
+                          freq=obj.reportinterval)
+    if itemtype is None:
+        typenumbers = [0, 1, 2, 4]
+    else:
+        try:
+            typenumbers = [obj.type_check(itemtype)]
+        except ValueError:
+            obj.close()
+            raise
+    datasets = {}
+    for typenumber in typenumbers:
+        values, names, variables = obj.get_type_array(typenumber)
+        coords = {'time': index, 'element': names}
+        if typenumber != 4:
+            props = obj.properties[typenumber]
+            for field, code in zip(props.dtype.names,
+                                   obj.propcode[typenumber]):
+                prop = props[field]
+                if code == 0:
+                    prop = [TYPECODE[typenumber][i] for i in prop.tolist()]
+                coords[field] = ('element', prop)
+        data_vars = dict(
+            (str(variable), (('time', 'element'), values[:, :, i]))
+            for i, variable in enumerate(variables))
+        datasets[obj.itemlist[typenumber]] = xr.Dataset(
+            data_vars,
+            coords=coords,
+            attrs={'source': filename,
+                   'itemtype': obj.itemlist[typenumber],
+                   'flowunits': _SWMM_FLOWUNITS.get(obj.swmm_flowunits)})
+
+    # The file is closed with the last Dataset, each counted only once.
+    unclosed = set(datasets)
+
+    def closer(key):
+        def close():
+            if key in unclosed:
+                unclosed.discard(key)
+                if not unclosed:
+                    obj.close()
+        return close
+
+    for key, dataset in datasets.items():
+        dataset.set_close(closer(key))
+    if itemtype is not None:
+        return datasets[obj.itemlist[typenumbers[0]]]
+    return datasets
 
 
 def main():
+    import mando
+
+    # Parsing the docstring of every command takes most of the start up
+    # time, so when a command is named only that one is registered.
+    names = [args[0] if args else fn.__name__
+             for fn, args, _ in _COMMANDS]
+    commands = _COMMANDS
+    if len(sys.argv) > 1 and sys.argv[1] in names:
+        commands = [_COMMANDS[names.index(sys.argv[1])]]
+    for fn, args, kwargs in commands:
+        mando.command(*args, **kwargs)(fn)
+
     if not os.path.exists('debug_swmmtoolbox'):
         sys.tracebacklimit = 0
     mando.main()
@@ -0,0 +1,162 @@
+"""
+Writes synthetic SWMM 5 binary output files for tests and benchmarks.
+
+The files have the layout read by 'SwmmExtract': the prologue, the names,
+the pollutant codes, the property tables, the variable codes, the start
+date and report interval, the period records, and the closing records.
+"""
+import datetime
+import struct
+
+import numpy as np
+
+MAGIC = 516114522
+
+# Number of variables SWMM 5.1 reports for each subcatchment, node, link,
+# and the system, before the pollutants.
+NVARS = {0: 8, 1: 6, 2: 5, 4: 15}
+
+# The same for versions before 5.1, see 'VARCODE_OLD'.
+NVARS_OLD = {0: 6, 1: 6, 2: 5, 4: 14}
+
+# Upper limit of the period records built in memory at once.
+_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def column_values(first, last, ncolumns, nperiods):
+    """Values written to the columns for periods first to last.
+
+    Column 'j' of period 'i' is 'j + i / nperiods', so every value tells
+    where it was read from.  Columns count the float32 values of a period
+    record after the date.
+    """
+    periods = np.arange(first, last, dtype='f8')[:, np.newaxis] / nperiods
+    return (np.arange(ncolumns, dtype='f8') + periods).astype('f4')
+
+
+def write_output(filename,
+                 nsubcatch=10,
+                 nnodes=20,
+                 nlinks=20,
+                 npolluts=0,
+                 nperiods=100,
+                 startdate=datetime.datetime(2000, 1, 1),
+                 reportinterval=600,
+                 version=51000,
+                 flowunits=0,
+                 nvars=None):
+    """Write a synthetic SWMM 5 output file.
+
+    Elements are named 'S1', 'J1', 'C1', and 'P1' onward for
+    subcatchments, nodes, links, and pollutants.  The period records hold
+    'column_values', written a block at a time so that memory does not
+    depend on the number of periods.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to write.
+    nsubcatch, nnodes, nlinks, npolluts : int
+        Number of each type of element.
+    nperiods : int
+        Number of reporting periods.
+    startdate : datetime.datetime
+        Start of the simulation.  The first period is reported one
+        'reportinterval' later.
+    reportinterval : int
+        Seconds between reporting periods.
+    version : int
+        SWMM version number written in the prologue.
+    flowunits : int
+        Flow units code.
+    nvars : dict
+        Number of variables of the subcatchments (0), nodes (1), links
+        (2), and the system (4), before the pollutants, which are added
+        to all but the system.  Types left out, or all with None, take
+        'NVARS', or 'NVARS_OLD' for a version before 5.1.
+
+    Returns
+    -------
+    The size of the file in bytes.
+    """
+    counts = [nsubcatch, nnodes, nlinks, npolluts]
+    base = dict(NVARS_OLD if version < 5100 else NVARS)
+    base.update(nvars or {})
+    nvars = dict((key, value + (npolluts if key != 4 else 0))
+                 for key, value in base.items())
+    ncolumns = (nsubcatch * nvars[0] +
+                nnodes * nvars[1] +
+                nlinks * nvars[2] +
+                nvars[4])
+    record = np.dtype([('date', 'f8'), ('values', 'f4', (ncolumns,))])
+
+    with open(filename, 'wb') as fp:
+        fp.write(struct.pack('7i',
+                             MAGIC,
+                             version,
+                             flowunits,
+                             nsubcatch,
+                             nnodes,
+                             nlinks,
+                             npolluts))
+
+        namesstartpos = fp.tell()
+        for prefix, count in zip('SJCP', counts):
+            for number in range(1, count + 1):
+                name = '{0}{1}'.format(prefix, number).encode('ascii')
+                fp.write(struct.pack('i', len(name)))
+                fp.write(name)
+        # Concentration units of each pollutant, 0 is mg/L.
+        fp.write(np.zeros(npolluts, dtype='i4').tobytes())
+
+        offset0 = fp.tell()
+        # Subcatchment area.
+        fp.write(struct.pack('2i', 1, 1))
+        fp.write(np.arange(1, nsubcatch + 1, dtype='f4').tobytes())
+        # Node type, invert elevation, and maximum depth.
+        fp.write(struct.pack('4i', 3, 0, 2, 3))
+        nodes = np.zeros(nnodes, dtype=[('type', 'i4'),
+                                        ('invert', 'f4'),
+                                        ('depth', 'f4')])
+        nodes['invert'] = np.arange(nnodes)
+        nodes['depth'] = 1.0
+        fp.write(nodes.tobytes())
+        # Link type, upstream and downstream offsets, maximum depth, and
+        # length.
+        fp.write(struct.pack('6i', 5, 0, 4, 4, 3, 5))
+        links = np.zeros(nlinks, dtype=[('type', 'i4'),
+                                        ('upstream', 'f4'),
+                                        ('downstream', 'f4'),
+                                        ('depth', 'f4'),
+                                        ('length', 'f4')])
+        links['depth'] = 1.0
+        links['length'] = np.arange(1, nlinks + 1) * 100.0
+        fp.write(links.tobytes())
+
+        for key in [0, 1, 2, 4]:
+            fp.write(struct.pack('i', nvars[key]))
+            fp.write(np.arange(nvars[key], dtype='i4').tobytes())
+
+        start = (startdate - datetime.datetime(1899, 12, 30)).total_seconds()
+        fp.write(struct.pack('d', start / 86400.0))
+        fp.write(struct.pack('i', reportinterval))
+
+        startpos = fp.tell()
+        block = max(1, _CHUNK_BYTES // record.itemsize)
+        for first in range(0, nperiods, block):
+            last = min(first + block, nperiods)
+            records = np.empty(last - first, dtype=record)
+            records['date'] = (start + reportinterval *
+                               np.arange(first + 1, last + 1)) / 86400.0
+            records['values'] = column_values(first, last, ncolumns,
+                                              nperiods)
+            fp.write(records.tobytes())
+
+        fp.write(struct.pack('6i',
+                             namesstartpos,
+                             offset0,
+                             startpos,
+                             nperiods,
+                             0,
+                             MAGIC))
+        return fp.tell()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_analysis
+----------------------------------
+
+Tests for the streaming analysis functions of the `swmmtoolbox` module.
+"""
+import os
+import shutil
+import struct
+import tempfile
+
+from unittest import TestCase
+
+import numpy as np
+
+from swmmtoolbox import swmmtoolbox
+
+
+class TestCompare(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_identical(self):
+        result = swmmtoolbox.compare(self.filename, self.filename)
+        self.assertEqual(len(result), 5170)
+        self.assertEqual(result['MAX_ABS_DIFF'].max(), 0)
+        self.assertTrue(result['FIRST_EXCEEDANCE'].isnull().all())
+
+    def test_changed_value(self):
+        changed = os.path.join(self.tmpdir, 'changed.out')
+        shutil.copy(self.filename, changed)
+        label = 'link,{0},0'.format(self.obj.names[2][4])
+        columns, _ = self.obj.get_offsets([label])
+        offset = (self.obj.startpos + 30 * self.obj.bytesperperiod +
+                  int(columns[0]) * self.obj.RECORDSIZE)
+        with open(changed, 'r+b') as fp:
+            fp.seek(offset)
+            value = struct.unpack('f', fp.read(4))[0]
+            fp.seek(offset)
+            fp.write(struct.pack('f', value + 0.5))
+        result = swmmtoolbox.compare(self.filename, changed,
+                                     'node,*,1', itemtype='link',
+                                     atol=0.1, chunk_periods=7)
+        self.assertEqual(len(result), 224 + 2230)
+        diff = result[result['MAX_ABS_DIFF'] > 0]
+        self.assertEqual(len(diff), 1)
+        self.assertEqual(diff['NAME'].iloc[0], self.obj.names[2][4])
+        self.assertAlmostEqual(diff['MAX_ABS_DIFF'].iloc[0], 0.5, places=5)
+        self.assertEqual(diff['FIRST_EXCEEDANCE'].iloc[0],
+                         self.obj.get_time_index()[30])
+
+    def test_incompatible(self):
+        partial = os.path.join(self.tmpdir, 'partial.out')
+        with open(self.filename, 'rb') as fp:
+            contents = fp.read()
+        with open(partial, 'wb') as fp:
+            fp.write(contents[:self.obj.startpos +
+                              10 * self.obj.bytesperperiod])
+        other = swmmtoolbox.SwmmExtract(partial, follow=True)
+        with self.assertRaises(ValueError):
+            self.obj.check_compatible(other)
+
+
+class TestSummary(TestCase):
+    def test_summary(self):
+        filename = os.path.join('tests', 'frutal.out')
+        result = swmmtoolbox.summary(filename,
+                                     itemtype='link',
+                                     threshold=0.01,
+                                     chunk_periods=7)
+        expected = swmmtoolbox.fast_extract(filename,
+                                            'link,*,*').astype('float64')
+        self.assertEqual(len(result), 2230)
+        self.assertEqual(list(result['VARIABLE'][:2]),
+                         ['Flow_rate', 'Flow_depth'])
+        self.assertTrue((result['MAX'].values ==
+                         expected.max().values).all())
+        self.assertTrue((result['MIN'].values ==
+                         expected.min().values).all())
+        self.assertTrue((result['MAX_TIME'].values ==
+                         expected.idxmax().values).all())
+        self.assertTrue(abs(result['MEAN'].values -
+                            expected.mean().values).max() < 1e-9)
+        self.assertTrue((result['INTEGRAL'] == result['SUM'] * 600).all())
+        self.assertTrue((result['COUNT_OVER'].values ==
+                         (expected > 0.01).sum().values).all())
+
+
+class TestEvents(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+
+    def test_chunk_boundaries(self):
+        expected = swmmtoolbox.events(self.filename,
+                                      'link,Flow_rate,>,0.05',
+                                      chunk_periods=100000)
+        for chunk_periods in [1, 7]:
+            result = swmmtoolbox.events(self.filename,
+                                        'link,Flow_rate,>,0.05',
+                                        chunk_periods=chunk_periods)
+            self.assertTrue(result.equals(expected))
+
+    def test_events(self):
+        result = swmmtoolbox.events(self.filename, 'link,0,>,0.05')
+        values = swmmtoolbox.fast_extract(self.filename, 'link,10,0')
+        values = values.iloc[:, 0]
+        event = result[result['NAME'] == '10'].iloc[0]
+        window = values[event['START']:event['END']]
+        self.assertTrue((window > 0.05).all())
+        self.assertEqual(event['PEAK'], window.max())
+        self.assertEqual(event['DURATION'].total_seconds(),
+                         len(window) * 600)
+        self.assertAlmostEqual(event['VOLUME'],
+                               window.astype('float64').sum() * 600)
+
+    def test_merge_and_filter(self):
+        result = swmmtoolbox.events(self.filename, 'link,Flow_rate,>,0.05')
+        merged = swmmtoolbox.events(self.filename,
+                                    'link,Flow_rate,>,0.05',
+                                    inter_event_gap='1h',
+                                    min_duration='30min')
+        self.assertTrue(len(merged) < len(result))
+        self.assertTrue((merged['DURATION'] >= '30min').all())
+
+    def test_bad_rule(self):
+        with self.assertRaises(ValueError):
+            swmmtoolbox.events(self.filename, 'link,Flow_rate,>>,1')
+        with self.assertRaises(ValueError):
+            swmmtoolbox.events(self.filename, 'link,Flow_rate,1')
+        with self.assertRaises(ValueError):
+            swmmtoolbox.events(self.filename)
+
+
+class TestEnsemble(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        columns, _ = obj.get_offsets(['link,10,0'])
+        self.filenames = [self.filename]
+        for member in range(3):
+            filename = os.path.join(self.tmpdir, '{0}.out'.format(member))
+            shutil.copy(self.filename, filename)
+            with open(filename, 'r+b') as fp:
+                fp.seek(obj.startpos + 5 * obj.bytesperperiod +
+                        columns[0] * obj.RECORDSIZE)
+                fp.write(struct.pack('f', member + 1.0))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ensemble(self):
+        labels = ['link,10,0', 'node,*,0']
+        result = swmmtoolbox.ensemble(self.filenames,
+                                      *labels,
+                                      percentiles='50',
+                                      chunk_periods=3)
+        values = np.stack([swmmtoolbox.extract_arr(i, *labels)
+                           for i in self.filenames])
+        self.assertEqual(list(result.columns[:4]),
+                         ['link_10_Flow_rate_mean',
+                          'link_10_Flow_rate_min',
+                          'link_10_Flow_rate_max',
+                          'link_10_Flow_rate_p50'])
+        self.assertTrue(np.allclose(result.values[:, 0::4],
+                                    values.mean(axis=0)))
+        self.assertTrue((result.values[:, 1::4] == values.min(axis=0)).all())
+        self.assertTrue((result.values[:, 2::4] == values.max(axis=0)).all())
+        self.assertTrue(np.allclose(result.values[:, 3::4],
+                                    np.median(values, axis=0)))
+        self.assertEqual(result.iloc[5, 2], 3.0)
+
+    def test_incompatible(self):
+        # Shorten the period count in the closing records.
+        shorter = self.filenames[1]
+        with open(shorter, 'r+b') as fp:
+            fp.seek(-3 * 4, 2)
+            fp.write(struct.pack('i', 10))
+        with self.assertRaises(ValueError) as context:
+            swmmtoolbox.ensemble([self.filename, shorter], 'link,10,0')
+        self.assertIn('swmm_nperiods', str(context.exception))
+
+    def test_companion(self):
+        expected = swmmtoolbox.ensemble(self.filenames, 'link,10,0')
+        swmmtoolbox.transpose(self.filenames[1])
+        profile = swmmtoolbox.Profile()
+        result = swmmtoolbox.ensemble(self.filenames, 'link,10,0',
+                                      profile=profile)
+        self.assertTrue((result.values == expected.values).all())
+        self.assertEqual(profile.name, 'ensemble')
+        # One column of the companion and the records of three files.
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.assertEqual(profile.counters['bytes_mapped'],
+                         obj.swmm_nperiods * (4 + 3 * obj.bytesperperiod))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            swmmtoolbox.ensemble([], 'link,10,0')
+        with self.assertRaises(ValueError):
+            swmmtoolbox.ensemble(self.filenames)
+
+    def test_truncated(self):
+        # Records missing from the end of one member, as after a copy
+        # that was cut short but kept its closing records.
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        truncated = self.filenames[1]
+        with open(self.filename, 'rb') as fp:
+            contents = fp.read()
+        end = obj.startpos + 100 * obj.bytesperperiod
+        with open(truncated, 'wb') as fp:
+            fp.write(contents[:end] + contents[-6 * 4:])
+        with self.assertRaises(ValueError) as context:
+            swmmtoolbox.ensemble(self.filenames, 'link,10,0')
+        self.assertIn('too short', str(context.exception))
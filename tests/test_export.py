@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_export
+----------------------------------
+
+Tests for the `export` and `open_dataset` functions of the `swmmtoolbox`
+module.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase, skipIf
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import h5py
+except ImportError:
+    h5py = None
+try:
+    import xarray
+except ImportError:
+    xarray = None
+
+from swmmtoolbox import swmmtoolbox
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.labels = ['node,{0},1'.format(obj.names[1][3]),
+                       'link,{0},0'.format(obj.names[2][0])]
+        self.expected = swmmtoolbox.fast_extract(self.filename, *self.labels)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        outfile = os.path.join(self.tmpdir, 'frutal.parquet')
+        swmmtoolbox.export(self.filename, outfile, *self.labels,
+                           itemtype='link', chunk_periods=50)
+        table = pq.read_table(outfile)
+        self.assertEqual(table.num_rows, 120)
+        # The two labels, then every other link variable.
+        self.assertEqual(table.num_columns, 1 + 223 * 10 + 1)
+        df = table.to_pandas()
+        self.assertTrue((df[self.expected.columns].values ==
+                         self.expected.values).all())
+        self.assertTrue((df['Datetime'].values ==
+                         self.expected.index.values).all())
+        metadata = json.loads(table.schema.metadata[b'swmmtoolbox'])
+        self.assertEqual(metadata['columns'][0]['variable'],
+                         'Hydraulic_head')
+        self.assertEqual(metadata['elements']['link']['1']['Type'],
+                         'Conduit')
+
+    @skipIf(h5py is None, 'h5py is not installed')
+    def test_hdf5(self):
+        outfile = os.path.join(self.tmpdir, 'frutal.h5')
+        swmmtoolbox.export(self.filename, outfile, *self.labels,
+                           chunk_periods=50)
+        with h5py.File(outfile, 'r') as h5:
+            self.assertEqual(h5['values'].dtype, 'f4')
+            self.assertTrue((h5['values'][:] ==
+                             self.expected.values).all())
+            self.assertEqual(len(h5['Datetime']), 120)
+
+    def test_bad_format(self):
+        with self.assertRaises(ValueError):
+            swmmtoolbox.export(self.filename,
+                               os.path.join(self.tmpdir, 'frutal.xyz'),
+                               *self.labels)
+
+
+class TestOpenDataset(TestCase):
+    @skipIf(xarray is None, 'xarray is not installed')
+    def test_open_dataset(self):
+        filename = os.path.join('tests', 'frutal.out')
+        obj = swmmtoolbox.SwmmExtract(filename)
+        datasets = swmmtoolbox.open_dataset(filename)
+        self.assertEqual(sorted(datasets),
+                         ['link', 'node', 'subcatchment', 'system'])
+        node = datasets['node']
+        self.assertEqual(node['Hydraulic_head'].shape, (120, 224))
+        # Backed by the memory mapped file, not a copy.
+        self.assertFalse(node['Hydraulic_head'].values.flags.owndata)
+        self.assertTrue((node.time.values ==
+                         obj.get_time_index().values).all())
+        name = obj.names[1][3]
+        self.assertTrue(
+            (node['Hydraulic_head'].sel(element=name).values ==
+             obj.get_series('node', name, 1)).all())
+        self.assertEqual(str(node['Type'].sel(element=name).values),
+                         'Junction')
+        link = swmmtoolbox.open_dataset(filename, 'link')
+        self.assertEqual(link['Flow_rate'].isel(time=slice(0, 5)).shape,
+                         (5, 223))
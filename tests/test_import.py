@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_import
+----------------------------------
+
+Tests that importing the `swmmtoolbox` module stays light and fast.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from unittest import TestCase
+
+# Seconds allowed to import the module after numpy is loaded.
+IMPORT_BUDGET = 0.25
+
+SCRIPT = '''
+import json
+import sys
+import time
+
+import numpy
+
+start = time.time()
+import swmmtoolbox.swmmtoolbox
+elapsed = time.time() - start
+
+print(json.dumps({'elapsed': elapsed,
+                  'modules': [i for i in ['pandas', 'tstoolbox', 'mando']
+                              if i in sys.modules]}))
+'''
+
+
+class TestImport(TestCase):
+    def run_script(self, script):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # -E ignores PYTHONPATH, so nothing else is preloaded.
+        output = subprocess.check_output([sys.executable, '-E', '-c', script],
+                                         cwd=root)
+        return json.loads(output.decode('utf-8').splitlines()[-1])
+
+    def test_no_heavy_imports(self):
+        result = self.run_script(SCRIPT)
+        self.assertEqual(result['modules'], [])
+
+    def test_import_budget(self):
+        # The best of a few runs, to ignore a cold disk cache.
+        elapsed = min(self.run_script(SCRIPT)['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+    def test_read_without_pandas(self):
+        script = '''
+import json
+import sys
+
+from swmmtoolbox import swmmtoolbox
+
+obj = swmmtoolbox.SwmmExtract('tests/frutal.out')
+columns, _ = obj.get_offsets(['link,10,0'])
+values = obj.get_values(columns, *obj.get_period_range(end_period=4))
+print(json.dumps({'shape': list(values.shape),
+                  'modules': [i for i in ['pandas', 'tstoolbox', 'mando']
+                              if i in sys.modules]}))
+'''
+        result = self.run_script(script)
+        self.assertEqual(result['shape'], [5, 1])
+        self.assertEqual(result['modules'], [])
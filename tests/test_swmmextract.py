@@ -0,0 +1,788 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_swmmextract
+----------------------------------
+
+Tests for the `SwmmExtract` reader in the `swmmtoolbox` module.
+"""
+import datetime
+import gc
+import os
+import shutil
+import tempfile
+import tracemalloc
+import warnings
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest import skipIf
+
+import numpy as np
+
+from swmmtoolbox import swmmtoolbox
+from swmmtoolbox import synthetic
+
+try:
+    import xarray
+except ImportError:
+    xarray = None
+
+
+class TestResults(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+
+    def test_record_size(self):
+        self.assertEqual(self.obj.record_dtype.itemsize,
+                         self.obj.bytesperperiod)
+        self.assertEqual(len(self.obj.results), self.obj.swmm_nperiods)
+
+    def test_get_series(self):
+        for typenumber, name, varindex in [(0, self.obj.names[0][2], 4),
+                                           (1, self.obj.names[1][3], 1),
+                                           (2, self.obj.names[2][5], 2),
+                                           (4, self.obj.names[4][0], 3)]:
+            series = self.obj.get_series(typenumber, name, varindex)
+            self.assertEqual(len(series), self.obj.swmm_nperiods)
+            for period in [0, 7, self.obj.swmm_nperiods - 1]:
+                date, value = self.obj.get_swmm_results(typenumber,
+                                                        name,
+                                                        varindex,
+                                                        period)
+                self.assertEqual(self.obj.results['date'][period], date)
+                self.assertAlmostEqual(series[period], value)
+
+
+class TestExtract(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.labels = ['node,{0},1'.format(self.obj.names[1][3]),
+                       'link,{0},0'.format(self.obj.names[2][0]),
+                       'system,{0},3'.format(self.obj.names[4][0]),
+                       'subcatchment,{0},4'.format(self.obj.names[0][1])]
+
+    def test_get_values(self):
+        columns, headings = self.obj.get_offsets(self.labels)
+        values = self.obj.get_values(columns)
+        self.assertEqual(values.shape, (self.obj.swmm_nperiods, 4))
+        self.assertEqual(headings[0],
+                         'node_{0}_Hydraulic_head'.format(
+                             self.obj.names[1][3]))
+        for period in [0, 50, self.obj.swmm_nperiods - 1]:
+            for col, label in enumerate(self.labels):
+                itemtype, name, varindex = label.split(',')
+                _, value = self.obj.get_swmm_results(
+                    self.obj.type_check(itemtype), name, int(varindex),
+                    period)
+                self.assertAlmostEqual(values[period, col], value)
+
+    def test_fast_extract(self):
+        df = swmmtoolbox.fast_extract(self.filename, *self.labels)
+        self.assertEqual(df.shape, (self.obj.swmm_nperiods, 4))
+        self.assertEqual(str(df.index[0]), '2012-11-19 00:10:00')
+        arr = swmmtoolbox.extract_arr(self.filename, *self.labels)
+        self.assertTrue((df.values == arr).all())
+
+    def test_bad_variable(self):
+        with self.assertRaises(ValueError):
+            self.obj.get_offsets(['node,{0},40'.format(self.obj.names[1][3])])
+
+    def test_docstrings(self):
+        # Every shared description is filled in.
+        for function in [swmmtoolbox.extract,
+                         swmmtoolbox.fast_extract,
+                         swmmtoolbox.extract_arr,
+                         swmmtoolbox.ensemble]:
+            self.assertNotIn('{', function.__doc__)
+
+
+class TestResolve(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+
+    def test_name_index(self):
+        for typenumber in [0, 1, 2, 3, 4]:
+            for index, name in enumerate(self.obj.names[typenumber]):
+                self.assertEqual(self.obj.name_check(typenumber, name),
+                                 (name, index))
+
+    def test_resolve(self):
+        name = self.obj.names[2][7]
+        self.assertEqual(self.obj.resolve(['link,{0},3'.format(name),
+                                           ('link', name, 0)]),
+                         [(2, name, 7, 3), (2, name, 7, 0)])
+
+    def test_resolve_reports_all(self):
+        with self.assertRaises(ValueError) as cm:
+            self.obj.resolve(['node,nothere,1',
+                              'link,{0},0'.format(self.obj.names[2][0]),
+                              'link,alsonothere,0'])
+        self.assertIn('2 of 3', str(cm.exception))
+        self.assertIn('nothere', str(cm.exception))
+        self.assertIn('alsonothere', str(cm.exception))
+
+
+class TestIterChunks(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.labels = ['node,{0},1'.format(self.obj.names[1][3]),
+                       'link,{0},0'.format(self.obj.names[2][0])]
+
+    def test_chunks(self):
+        chunks = list(self.obj.iter_chunks(self.labels, chunk_periods=50))
+        self.assertEqual([len(i) for i in chunks], [50, 50, 20])
+        whole = swmmtoolbox.fast_extract(self.filename, *self.labels)
+        for chunk in chunks:
+            self.assertTrue((whole.loc[chunk.index].values ==
+                             chunk.values).all())
+
+    def test_array_chunks(self):
+        chunks = list(self.obj.iter_chunks(self.labels,
+                                           chunk_periods=1000,
+                                           dataframe=False))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].shape, (self.obj.swmm_nperiods, 2))
+
+
+class TestTimeWindow(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.label = 'node,{0},1'.format(self.obj.names[1][3])
+
+    def test_period_range(self):
+        self.assertEqual(self.obj.get_period_range(), (0, 120))
+        self.assertEqual(self.obj.get_period_range('2012-11-19 01:00',
+                                                   '2012-11-19 02:00'),
+                         (5, 12))
+        self.assertEqual(self.obj.get_period_range('2012-11-19 01:05',
+                                                   '2012-11-19 01:55'),
+                         (6, 11))
+        self.assertEqual(self.obj.get_period_range(start_period=5,
+                                                   end_period=9),
+                         (5, 10))
+        self.assertEqual(self.obj.get_period_range('2013-01-01'),
+                         (120, 120))
+
+    def test_extract_window(self):
+        whole = swmmtoolbox.fast_extract(self.filename, self.label)
+        window = swmmtoolbox.fast_extract(self.filename,
+                                          self.label,
+                                          start_date='2012-11-19 01:00',
+                                          end_date='2012-11-19 02:00')
+        self.assertEqual(len(window), 7)
+        self.assertTrue((whole.iloc[5:12] == window).all().all())
+        arr = swmmtoolbox.extract_arr(self.filename,
+                                      self.label,
+                                      start_period=5,
+                                      end_period=11)
+        self.assertTrue((arr == window.values[:, 0]).all())
+
+
+class TestTimeIndex(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+
+    def test_time_index(self):
+        index = self.obj.get_time_index()
+        self.assertEqual(len(index), self.obj.swmm_nperiods)
+        self.assertEqual(index[0],
+                         self.obj.startdate + self.obj.reportinterval)
+        self.assertTrue((index[1:] - index[:-1] ==
+                         self.obj.reportinterval).all())
+        self.assertTrue((self.obj.get_time_index(5, 8) ==
+                         index[5:8]).all())
+        self.assertTrue((self.obj.get_time_index(-3) == index[-3:]).all())
+
+    def test_recorded_dates(self):
+        self.assertTrue((self.obj.get_time_index() ==
+                         swmmtoolbox._to_datetime(
+                             self.obj.results['date'])).all())
+
+    def test_window_reads_no_records(self):
+        # Only the dates of the window are computed, nothing is mapped.
+        self.assertEqual(len(self.obj.get_time_index(10, 20)), 10)
+        self.assertIsNone(self.obj._results)
+
+
+class TestResample(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.labels = ['link,10,0', 'node,*,0']
+        self.full = swmmtoolbox.fast_extract(self.filename,
+                                             *self.labels).astype('float64')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_matches_pandas(self):
+        for freq in ['1h', '7min', '5min']:
+            result = swmmtoolbox.fast_extract(self.filename,
+                                              *self.labels,
+                                              resample=freq,
+                                              how='mean,max')
+            expected = self.full.resample(freq).agg(['mean', 'max'])
+            self.assertTrue((result.index == expected.index).all())
+            self.assertTrue(np.allclose(result.values, expected.values,
+                                        equal_nan=True))
+            self.assertEqual(result.columns[1], 'link_10_Flow_rate_max')
+
+    def test_start_day(self):
+        # Reports from 23:55, so bins start at midnight of the first
+        # period read and not of the start date.
+        filename = os.path.join(self.tmpdir, 'midnight.out')
+        synthetic.write_output(filename,
+                               nsubcatch=1,
+                               nnodes=2,
+                               nlinks=1,
+                               nperiods=700,
+                               startdate=datetime.datetime(1999, 12, 31,
+                                                           23, 50),
+                               reportinterval=300)
+        full = swmmtoolbox.fast_extract(filename,
+                                        'node,*,0').astype('float64')
+        for freq in ['7h', '13min', '1D']:
+            for start_date in [None, '2000-01-02 01:00']:
+                result = swmmtoolbox.fast_extract(filename,
+                                                  'node,*,0',
+                                                  resample=freq,
+                                                  how='mean,count',
+                                                  start_date=start_date)
+                expected = full[start_date:].resample(freq).agg(
+                    ['mean', 'count'])
+                self.assertTrue((result.index == expected.index).all())
+                self.assertTrue(np.allclose(result.values, expected.values,
+                                            equal_nan=True))
+
+    def test_chunk_boundaries(self):
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        columns, _ = obj.get_offsets(self.labels)
+        index, whole = obj.get_resampled(columns, '1h', how=['min', 'sum'])
+        _, chunked = obj.get_resampled(columns, '1h', how=['min', 'sum'],
+                                       chunk_periods=7)
+        self.assertEqual(len(index), 21)
+        self.assertTrue((whole['min'] == chunked['min']).all())
+        self.assertTrue(np.allclose(whole['sum'], chunked['sum']))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            swmmtoolbox.extract_arr(self.filename, 'link,10,0',
+                                    resample='1h', how='median')
+        with self.assertRaises(ValueError):
+            swmmtoolbox.extract_arr(self.filename, 'link,10,0',
+                                    resample='M')
+
+
+class TestWorkers(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+        self.columns, _ = self.obj.get_offsets(['link,*,*', 'node,*,*'])
+
+    def test_shards(self):
+        expected = self.obj.get_values(self.columns)
+        for workers in [2, 3, 1000]:
+            result = self.obj.get_values(self.columns, workers=workers)
+            self.assertTrue((result == expected).all())
+        result = self.obj.get_values(self.columns, 5, 12, workers=4)
+        self.assertTrue((result == expected[5:12]).all())
+
+    def test_read_periods(self):
+        self.assertTrue((self.obj._read_periods(3, 7) ==
+                         self.obj.flat[3:7]).all())
+
+
+class TestMemory(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'wide.out')
+        synthetic.write_output(self.filename,
+                               nsubcatch=100,
+                               nnodes=500,
+                               nlinks=500,
+                               npolluts=1,
+                               nperiods=400)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def peak(self, function, *args, **kwds):
+        tracemalloc.start()
+        try:
+            function(*args, **kwds)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_one_series(self):
+        # Peak memory follows the columns asked for, not the size of the
+        # period records they are gathered from.
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            # The pollutant name leaves the records unaligned, like most
+            # real files, where 'np.take' copies the whole range.
+            self.assertFalse(obj.flat.flags.aligned)
+            columns, _ = obj.get_offsets(['node,J1,0'])
+            limit = obj.swmm_nperiods * obj.bytesperperiod // 20
+            obj.results
+            self.assertLess(self.peak(obj.get_values, columns), limit)
+        # Once, so the deferred imports are not counted.
+        swmmtoolbox.extract_arr(self.filename, 'node,J1,0')
+        self.assertLess(self.peak(swmmtoolbox.extract_arr,
+                                  self.filename,
+                                  'node,J1,0'), limit)
+        swmmtoolbox.transpose(self.filename)
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            self.assertIsNotNone(obj.series)
+            self.assertLess(self.peak(obj.get_values, columns), limit)
+
+
+class TestThreadSafety(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+
+    def test_concurrent_results(self):
+        labels = (self.obj.type_labels(1)[:30] +
+                  self.obj.type_labels(2)[:30] +
+                  self.obj.type_labels(4))
+
+        def check(label):
+            typenumber, name, variableindex = label
+            series = self.obj.get_series(typenumber, name, variableindex)
+            for period in [0, 7, self.obj.swmm_nperiods - 1]:
+                date, value = self.obj.get_swmm_results(typenumber,
+                                                        name,
+                                                        variableindex,
+                                                        period)
+                if (np.float32(value) != series[period] or
+                        date != self.obj.results['date'][period]):
+                    return False
+            return True
+
+        with ThreadPoolExecutor(8) as pool:
+            self.assertTrue(all(pool.map(check, labels * 4)))
+
+    def test_no_mutation(self):
+        varcode = dict((i, dict(j)) for i, j in self.obj.varcode.items())
+        self.obj.name_check('link', '10')
+        self.obj.update_var_code(2)
+        self.assertFalse(hasattr(self.obj, 'itemtype'))
+        self.assertEqual(self.obj.varcode, varcode)
+        self.assertEqual(self.obj.varcode[2][5], 'OD')
+        self.assertNotIn(5, swmmtoolbox.VARCODE[2])
+
+
+class TestProfile(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+
+    def test_extract_arr(self):
+        profile = swmmtoolbox.Profile(memory=True)
+        swmmtoolbox.extract_arr(self.filename, 'link,*,0', profile=profile)
+        self.assertEqual(profile.name, 'extract_arr')
+        self.assertEqual(list(profile.timings),
+                         ['header', 'labels', 'dates', 'read', 'output',
+                          'total'])
+        phases = sum(profile.timings.values()) - profile.timings['total']
+        self.assertLessEqual(phases, profile.timings['total'])
+        self.assertEqual(profile.counters['bytes_mapped'],
+                         self.obj.swmm_nperiods * self.obj.bytesperperiod)
+        self.assertGreater(profile.counters['mmaps'], 0)
+        self.assertEqual(profile.counters['seeks'], 2)
+        self.assertGreater(profile.peak_memory, 0)
+
+    def test_workers(self):
+        profile = swmmtoolbox.Profile()
+        obj = swmmtoolbox.SwmmExtract(self.filename, profile=profile)
+        columns, _ = obj.get_offsets(['node,*,0'])
+        obj.get_values(columns, workers=3)
+        self.assertEqual(profile.counters['bytes_read'],
+                         24 + 4 + obj.swmm_nperiods * obj.bytesperperiod)
+        self.assertIsNone(profile.peak_memory)
+
+    def test_callbacks(self):
+        profiles = []
+        swmmtoolbox.fast_extract(self.filename, 'node,*,0',
+                                 profile=profiles.append)
+        swmmtoolbox.add_profile_hook(profiles.append)
+        try:
+            swmmtoolbox.extract_arr(self.filename, 'node,*,0',
+                                    resample='1h')
+        finally:
+            swmmtoolbox.remove_profile_hook(profiles.append)
+        swmmtoolbox.extract_arr(self.filename, 'node,*,0')
+        self.assertEqual([i.name for i in profiles],
+                         ['fast_extract', 'extract_arr'])
+        self.assertIn('frame', profiles[0].timings)
+        self.assertIn('resample', profiles[1].as_dict()['timings'])
+        self.assertIn('bytes_mapped', str(profiles[1]))
+
+
+class TestClose(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertCloses(self, function, *args, **kwargs):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', ResourceWarning)
+            try:
+                function(*args, **kwargs)
+            except ValueError:
+                pass
+            gc.collect()
+        self.assertEqual([str(i.message) for i in caught
+                          if issubclass(i.category, ResourceWarning)], [])
+
+    def test_functions(self):
+        self.assertCloses(swmmtoolbox.extract_arr, self.filename,
+                          'node,*,0')
+        self.assertCloses(swmmtoolbox.fast_extract, self.filename,
+                          'node,*,0', resample='1h')
+        self.assertCloses(swmmtoolbox.summary, self.filename, 'node,*,0')
+        self.assertCloses(swmmtoolbox.compare, self.filename,
+                          self.filename, 'node,*,0')
+        self.assertCloses(swmmtoolbox.events, self.filename,
+                          'link,Flow_rate,>,1')
+        self.assertCloses(swmmtoolbox.ensemble,
+                          [self.filename, self.filename], 'node,*,0')
+        self.assertCloses(swmmtoolbox.listvariables, self.filename)
+        self.assertCloses(swmmtoolbox.catalog, self.filename)
+
+    @skipIf(xarray is None, 'xarray is not installed')
+    def test_open_dataset(self):
+        def close_all():
+            datasets = swmmtoolbox.open_dataset(self.filename)
+            for dataset in datasets.values():
+                dataset.close()
+                dataset.close()
+
+        def close_with():
+            with swmmtoolbox.open_dataset(self.filename, 'link') as link:
+                link['Flow_rate'].isel(time=0).values
+
+        self.assertCloses(close_all)
+        self.assertCloses(close_with)
+        self.assertCloses(swmmtoolbox.open_dataset, self.filename, 'nothing')
+
+        # The file stays open until the last Dataset is closed.
+        datasets = swmmtoolbox.open_dataset(self.filename)
+        for name in ['node', 'link', 'system']:
+            datasets[name].close()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', ResourceWarning)
+            del datasets
+            gc.collect()
+        self.assertEqual(len([i for i in caught
+                              if issubclass(i.category, ResourceWarning)]),
+                         1)
+
+    def test_bad_magic(self):
+        filename = os.path.join(self.tmpdir, 'bad.out')
+        with open(filename, 'wb') as fp:
+            fp.write(b'\0' * 64)
+        self.assertCloses(swmmtoolbox.SwmmExtract, filename)
+        with self.assertRaises(ValueError):
+            swmmtoolbox.SwmmExtract(filename)
+
+
+class TestBatchExtract(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.other = os.path.join(self.tmpdir, 'other.out')
+        shutil.copy(self.filename, self.other)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_files_and_labels(self):
+        filenames, labels = swmmtoolbox._files_and_labels(
+            [self.filename, 'link,10,0', self.other, 'node,*,0'])
+        self.assertEqual(filenames, [self.filename, self.other])
+        self.assertEqual(labels, ['link,10,0', 'node,*,0'])
+        # A mistyped file is reported as missing, not as a bad label.
+        missing = os.path.join(self.tmpdir, 'otehr.out')
+        with self.assertRaises(ValueError) as context:
+            swmmtoolbox._files_and_labels([missing, 'link,10,0'])
+        self.assertIn('otehr.out', str(context.exception))
+        self.assertIn('do not exist', str(context.exception))
+
+    def test_pool(self):
+        expected = swmmtoolbox.fast_extract(self.filename,
+                                            'link,10,0', 'node,*,0')
+        result = swmmtoolbox.batch_extract([self.filename, self.other],
+                                           'link,10,0', 'node,*,0',
+                                           jobs=2)
+        self.assertEqual(sorted(result), sorted([self.filename,
+                                                 self.other]))
+        self.assertTrue(result[self.filename].equals(expected))
+        self.assertTrue(result[self.other].equals(expected))
+
+    def test_combine(self):
+        result = swmmtoolbox.batch_extract([self.filename, self.other],
+                                           'link,10,0',
+                                           jobs=1,
+                                           combine=True)
+        self.assertEqual(list(result.columns),
+                         [self.filename + ':link_10_Flow_rate',
+                          self.other + ':link_10_Flow_rate'])
+
+    def test_outdir(self):
+        result = swmmtoolbox.batch_extract([self.other],
+                                           'link,10,0',
+                                           jobs=1,
+                                           outdir=self.tmpdir)
+        self.assertEqual(result,
+                         {self.other: os.path.join(self.tmpdir,
+                                                   'other.csv')})
+        self.assertTrue(os.path.exists(result[self.other]))
+
+
+class TestProperties(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+        self.obj = swmmtoolbox.SwmmExtract(self.filename)
+
+    def test_records(self):
+        links = self.obj.properties[2]
+        self.assertEqual(len(links), self.obj.swmm_nlinks)
+        self.assertEqual(links.dtype.names,
+                         ('Type', 'Inv_offset', 'Inv_offset.1',
+                          'Max_depth', 'Length'))
+        self.assertEqual(self.obj.prop[2][0],
+                         list(zip(self.obj.propcode[2],
+                                  links[0].tolist())))
+        self.assertEqual(len(self.obj.prop[0]), self.obj.swmm_nsubcatch)
+
+    def test_listdetail_name(self):
+        name = self.obj.names[1][3]
+        result = swmmtoolbox.listdetail(self.filename, 'node', name=name)
+        self.assertEqual(list(result.iloc[0]),
+                         list(swmmtoolbox.listdetail(self.filename,
+                                                     'node').iloc[3]))
+
+
+class TestLazy(TestCase):
+    def setUp(self):
+        self.filename = os.path.join('tests', 'frutal.out')
+
+    def test_lazy(self):
+        eager = swmmtoolbox.SwmmExtract(self.filename)
+        lazy = swmmtoolbox.SwmmExtract(self.filename, lazy=True)
+        self.assertIsNone(lazy._names)
+        self.assertIsNone(lazy._properties)
+        self.assertEqual(lazy.swmm_nperiods, eager.swmm_nperiods)
+        self.assertEqual(lazy.startpos, eager.startpos)
+        self.assertEqual(lazy.propcode, eager.propcode)
+        self.assertEqual(lazy.names, eager.names)
+        self.assertEqual(lazy.varcode, eager.varcode)
+        self.assertEqual(lazy.pollutant_codes, eager.pollutant_codes)
+        self.assertEqual(lazy.prop, eager.prop)
+        columns, _ = lazy.get_offsets(['link,*,0'])
+        self.assertTrue((lazy.get_values(columns) ==
+                         eager.get_values(columns)).all())
+
+    def test_context_manager(self):
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            obj.results
+            self.assertIsNotNone(obj._mmap)
+        self.assertTrue(obj.fp.closed)
+        self.assertIsNone(obj._mmap)
+        self.assertIsNone(obj._results)
+
+
+class TestHeaderCache(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'frutal.out')
+        shutil.copy(os.path.join('tests', 'frutal.out'), self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sidecar(self):
+        parsed = swmmtoolbox.SwmmExtract(self.filename, cache=True)
+        cachefile = self.filename + '.swmmtoolbox.npz'
+        self.assertTrue(os.path.exists(cachefile))
+        cached = swmmtoolbox.SwmmExtract(self.filename, cache=True)
+        for attr in ['names', 'prop', 'propcode', 'vars', 'pollutant_codes',
+                     'startdate', 'reportinterval', 'bytesperperiod']:
+            self.assertEqual(getattr(parsed, attr), getattr(cached, attr))
+
+    def test_stale_cache(self):
+        swmmtoolbox.SwmmExtract(self.filename, cache=self.tmpdir)
+        cachefile = [i for i in os.listdir(self.tmpdir)
+                     if i.endswith('.npz')][0]
+        cachefile = os.path.join(self.tmpdir, cachefile)
+        mtime = os.path.getmtime(cachefile)
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+        obj = swmmtoolbox.SwmmExtract(self.filename, cache=self.tmpdir)
+        self.assertEqual(obj.names[1][3], '46')
+        # The stale cache was replaced by one for the new mtime.
+        with np.load(cachefile) as cached:
+            self.assertTrue((cached['key'] == obj._cache_key()).all())
+
+    def test_damaged_cache(self):
+        swmmtoolbox.SwmmExtract(self.filename, cache=True)
+        cachefile = self.filename + '.swmmtoolbox.npz'
+        for size in [os.path.getsize(cachefile) // 2, 0]:
+            with open(cachefile, 'r+b') as fp:
+                fp.truncate(size)
+            obj = swmmtoolbox.SwmmExtract(self.filename, cache=True)
+            self.assertEqual(obj.names[1][3], '46')
+        # Rewritten, without leaving temporary files behind.
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['frutal.out', 'frutal.out.swmmtoolbox.npz'])
+        with np.load(cachefile) as cached:
+            self.assertTrue((cached['key'] == obj._cache_key()).all())
+
+
+class TestTranspose(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'frutal.out')
+        shutil.copy(os.path.join('tests', 'frutal.out'), self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_transpose(self):
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.assertIsNone(obj.series)
+        columns, _ = obj.get_offsets(
+            ['node,{0},1'.format(obj.names[1][3]),
+             'link,{0},0'.format(obj.names[2][0]),
+             'system,{0},3'.format(obj.names[4][0])])
+        expected = obj.get_values(columns)
+
+        swmmtoolbox.transpose(self.filename)
+        obj = swmmtoolbox.SwmmExtract(self.filename)
+        self.assertIsNotNone(obj.series)
+        self.assertTrue((obj.get_values(columns) == expected).all())
+        self.assertTrue((obj.get_values(columns, 10, 20) ==
+                         expected[10:20]).all())
+
+        # A changed output file makes the companion stale.
+        mtime = os.path.getmtime(self.filename)
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+        self.assertIsNone(swmmtoolbox.SwmmExtract(self.filename).series)
+
+    def test_threads(self):
+        # Threads writing the same companion each use their own
+        # temporary file and leave none behind.
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            with ThreadPoolExecutor(4) as pool:
+                for future in [pool.submit(obj.write_transposed)
+                               for _ in range(8)]:
+                    future.result()
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['frutal.out', 'frutal.out.swmmtoolbox.series'])
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            self.assertIsNotNone(obj.series)
+
+
+class TestTypeArray(TestCase):
+    def setUp(self):
+        self.obj = swmmtoolbox.SwmmExtract(os.path.join('tests',
+                                                        'frutal.out'))
+
+    def test_get_type_array(self):
+        values, names, variables = self.obj.get_type_array('node')
+        self.assertEqual(values.shape, (120, 224, 11))
+        self.assertEqual(names, self.obj.names[1])
+        self.assertEqual(variables[1], 'Hydraulic_head')
+        self.assertTrue((values[:, 3, 1] ==
+                         self.obj.get_series('node', names[3], 1)).all())
+        values, names, _ = self.obj.get_type_array('system', 5, 10)
+        self.assertEqual(values.shape, (5, 1, 14))
+        self.assertEqual(names, ['system'])
+
+    def test_wildcards(self):
+        self.assertEqual(len(self.obj.resolve(['node,*,*'])), 224 * 11)
+        resolved = self.obj.resolve(['link,*,0'])
+        self.assertEqual([i[1] for i in resolved], self.obj.names[2])
+        self.assertEqual(self.obj.resolve(['system,*,2']),
+                         [(4, self.obj.names[4][2], 2, 2)])
+        columns, _ = self.obj.get_offsets(['link,*,0'])
+        self.assertTrue((self.obj.get_values(columns) ==
+                         self.obj.get_type_array('link')[0][:, :, 0]).all())
+
+
+class TestFollow(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'live.out')
+        source = os.path.join('tests', 'frutal.out')
+        with open(source, 'rb') as fp:
+            self.contents = fp.read()
+        obj = swmmtoolbox.SwmmExtract(source)
+        self.startpos = obj.startpos
+        self.bytesperperiod = obj.bytesperperiod
+        self.labels = ['node,{0},1'.format(obj.names[1][3])]
+        self.expected = swmmtoolbox.fast_extract(source, *self.labels)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_follow(self):
+        with open(self.filename, 'wb') as fp:
+            # Three periods and part of the fourth.
+            end = self.startpos + 3 * self.bytesperperiod + 100
+            fp.write(self.contents[:end])
+            fp.flush()
+            obj = swmmtoolbox.SwmmExtract(self.filename, follow=True)
+            self.assertEqual(obj.swmm_nperiods, 3)
+            self.assertFalse(obj.complete)
+            first = obj.poll(self.labels)
+            self.assertTrue((first.values == self.expected.values[:3]).all())
+            self.assertEqual(len(obj.poll(self.labels)), 0)
+
+            fp.write(self.contents[end:self.startpos +
+                                   50 * self.bytesperperiod])
+            fp.flush()
+            # Polling a shared instance leaves the file position alone.
+            obj.fp.seek(5)
+            second = obj.poll(self.labels)
+            self.assertEqual(obj.fp.tell(), 5)
+            self.assertEqual(len(second), 47)
+            self.assertTrue((second.index == self.expected.index[3:50]).all())
+
+            fp.write(self.contents[self.startpos +
+                                   50 * self.bytesperperiod:])
+            fp.flush()
+            rows = list(obj.follow_periods(self.labels, interval=0.01,
+                                           timeout=1))
+            self.assertEqual(len(rows), 70)
+            self.assertEqual(obj.fp.tell(), 5)
+            self.assertTrue(obj.complete)
+            self.assertEqual(obj.swmm_nperiods, 120)
+            self.assertEqual(rows[-1].iloc[0, 0],
+                             self.expected.iloc[-1, 0])
+
+    def test_incomplete_header(self):
+        with open(self.filename, 'wb') as fp:
+            fp.write(self.contents[:200])
+        with self.assertRaises(ValueError):
+            swmmtoolbox.SwmmExtract(self.filename, follow=True)
+
+    def test_new_file(self):
+        # Just created by SWMM, before the first magic number is written.
+        for size in [0, 3]:
+            with open(self.filename, 'wb') as fp:
+                fp.write(self.contents[:size])
+            for follow in [True, False]:
+                with self.assertRaisesRegex(ValueError, 'incomplete'):
+                    swmmtoolbox.SwmmExtract(self.filename, follow=follow)
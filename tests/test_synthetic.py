@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_synthetic
+----------------------------------
+
+Tests that the synthetic output files read back through `SwmmExtract`.
+"""
+import datetime
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+import numpy as np
+
+from swmmtoolbox import swmmtoolbox
+from swmmtoolbox import synthetic
+
+
+class TestWriteOutput(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'synthetic.out')
+        self.size = synthetic.write_output(self.filename,
+                                           nsubcatch=3,
+                                           nnodes=4,
+                                           nlinks=5,
+                                           npolluts=2,
+                                           nperiods=7)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_header(self):
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            self.assertEqual(self.size, os.path.getsize(self.filename))
+            self.assertEqual(obj.swmm_nperiods, 7)
+            self.assertEqual(obj.names[0], ['S1', 'S2', 'S3'])
+            self.assertEqual(obj.names[1], ['J1', 'J2', 'J3', 'J4'])
+            self.assertEqual(obj.names[2], ['C1', 'C2', 'C3', 'C4', 'C5'])
+            self.assertEqual(obj.names[3], ['P1', 'P2'])
+            self.assertEqual(list(obj.properties[1]['Inv_elev']),
+                             [0, 1, 2, 3])
+            self.assertEqual(list(obj.properties[2]['Length']),
+                             [100, 200, 300, 400, 500])
+            self.assertEqual(len(obj.vars[0]), 10)
+
+    def test_dates(self):
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            index = obj.get_time_index()
+        self.assertEqual(index[0], datetime.datetime(2000, 1, 1, 0, 10))
+        self.assertEqual(index[-1], datetime.datetime(2000, 1, 1, 1, 10))
+
+    def test_values(self):
+        with swmmtoolbox.SwmmExtract(self.filename) as obj:
+            flat = obj._read_periods(0, 7)
+        columns = flat.shape[1] - 2
+        np.testing.assert_array_equal(
+            flat[:, 2:], synthetic.column_values(0, 7, columns, 7))
+
+    def test_lazy(self):
+        with swmmtoolbox.SwmmExtract(self.filename, lazy=True) as obj:
+            self.assertEqual(obj.names[2][-1], 'C5')
+            self.assertEqual(list(obj.properties[0]['Area']),
+                             [1, 2, 3])
+
+    def test_extract_arr(self):
+        # The first node variable follows the 3 * 10 subcatchment values.
+        result = swmmtoolbox.extract_arr(self.filename, 'node,J1,0')
+        np.testing.assert_array_equal(
+            result, synthetic.column_values(0, 7, 31, 7)[:, 30])
+
+    def test_nvars(self):
+        filename = os.path.join(self.tmpdir, 'old.out')
+        synthetic.write_output(filename, nperiods=3, version=5022)
+        with swmmtoolbox.SwmmExtract(filename) as obj:
+            self.assertEqual(obj.swmm_nsubcatchvars,
+                             len(swmmtoolbox.VARCODE_OLD[0]))
+            self.assertEqual(obj.nsystemvars,
+                             len(swmmtoolbox.VARCODE_OLD[4]))
+        synthetic.write_output(filename, nperiods=3, npolluts=1,
+                               nvars={1: 2, 4: 3})
+        with swmmtoolbox.SwmmExtract(filename) as obj:
+            self.assertEqual(obj.swmm_nsubcatchvars, 9)
+            self.assertEqual(obj.nnodevars, 3)
+            self.assertEqual(obj.nlinkvars, 6)
+            self.assertEqual(obj.nsystemvars, 3)